@@ -0,0 +1,77 @@
+import threading
+HALVE_COUNTERS = bytes(count >> 1 for count in range(256))
+class CountMinSketch:
+    # Approximate per-key counters in depth rows of width saturating byte counters. After sample_size increments
+    # every counter is halved, so the estimates follow recent traffic rather than all-time totals.
+    def __init__(self, width, depth, sample_size):
+        self.width = width
+        self.depth = depth
+        self.sample_size = sample_size
+        self.rows = [bytearray(width) for _ in range(depth)]
+        self.increments = 0
+        self.lock = threading.Lock()
+
+    def get_indexes(self, key):
+        key_hash = hash(key)
+        first = key_hash & 0xFFFFFFFF
+        second = ((key_hash >> 32) & 0xFFFFFFFF) | 1
+        return [(first + row * second) % self.width for row in range(self.depth)]
+
+    def estimate(self, key):
+        return min(row[index] for row, index in zip(self.rows, self.get_indexes(key)))
+
+    def increment(self, key):
+        indexes = self.get_indexes(key)
+        with self.lock:
+            estimate = min(row[index] for row, index in zip(self.rows, indexes))
+            # conservative update: only the counters at the current minimum are raised
+            if estimate < 255:
+                for row, index in zip(self.rows, indexes):
+                    if row[index] == estimate:
+                        row[index] = estimate + 1
+            self.increments += 1
+            if self.increments >= self.sample_size:
+                self.age()
+            return min(estimate + 1, 255)
+
+    def age(self):
+        for row in self.rows:
+            row[:] = row.translate(HALVE_COUNTERS)
+        self.increments = 0
+
+
+class AdmissionPolicy:
+    # A miss is written to Redis once its key has been seen admission_threshold times. With adaptive TTLs an
+    # admitted key that is still below hot_threshold gets min_ttl, a hot one max_ttl, and a key whose hits
+    # carry it across hot_threshold has its expiry extended to max_ttl once.
+    def __init__(self, sketch, admission_threshold, adaptive_ttl, hot_threshold, min_ttl, max_ttl, default_ttl):
+        self.sketch = sketch
+        self.admission_threshold = admission_threshold
+        self.adaptive_ttl = adaptive_ttl
+        self.hot_threshold = hot_threshold
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.default_ttl = default_ttl
+        self.rejected = 0
+
+    def get_expiration_time(self, cache_key):
+        # returns (admit, expiration time)
+        count = self.sketch.increment(cache_key)
+        if count < self.admission_threshold:
+            self.rejected += 1
+            return False, None
+        if not self.adaptive_ttl:
+            return True, self.default_ttl
+        return True, self.max_ttl if count >= self.hot_threshold else self.min_ttl
+
+    def may_admit(self, cache_key):
+        # whether the next get_expiration_time() of the key would admit it, without counting a sighting
+        return min(self.sketch.estimate(cache_key) + 1, 255) >= self.admission_threshold
+
+    def get_extended_expiration_time(self, cache_key):
+        # called on a hit; returns the new expiration time when the key just became hot, otherwise None
+        if not self.adaptive_ttl:
+            return None
+        if self.sketch.increment(cache_key) == self.hot_threshold:
+            return self.max_ttl
+        return None
@@ -1,5 +1,9 @@
 import os
 from datetime import datetime
+import asyncio
+import functools
+import gc
+import json
 import re
 import subprocess
 import traceback
@@ -19,6 +23,12 @@ from opencensus.stats import stats as stats_module
 from opencensus.stats import view as view_module
 from opencensus.tags import tag_map as tag_map_module
 from redis_cache import *
+from async_redis_cache import AsyncRedisCache
+from cache_metrics import CacheMetrics, cache_views
+from segmentation import split_into_segments, merge_segment_tgt_dicts
+from concurrent.futures import ThreadPoolExecutor
+from inference_pool import InferencePool, InferencePoolUnavailable
+from stage_profiler import StageProfiler, stage_latency_view
 
 word_re = re.compile('\\w+', re.UNICODE)
 script_dir = os.path.dirname(__file__) #<-- absolute dir the script is in
@@ -52,7 +62,12 @@ requests_view = view_module.View("requests view",
                                aggregation_module.CountAggregation())
 reinflections_view_measurement_map = stats_recorder.new_measurement_map()
 requests_view_measurement_map = stats_recorder.new_measurement_map()
-redis_connect = None
+cache_options = None
+redis_cache = None
+async_redis_cache = None
+inference_executor = None
+inference_pool = None
+stage_profiler = None
 
 def get_hostname_cpu():
     cpu_type_command = "cat /proc/cpuinfo"
@@ -61,7 +76,12 @@ def get_hostname_cpu():
     return cpu_useful_info
 
 def init():
-    global redis_connect
+    global cache_options
+    global redis_cache
+    global async_redis_cache
+    global inference_executor
+    global inference_pool
+    global stage_profiler
     # Make sure the model version is in sync with gender_debias_pipeline/AML-config/blue-deployment-azure.yml
     model_path = os.path.join(os.getenv("AZUREML_MODEL_DIR"), "modelfiles")
     config_path = os.path.join(model_path, "default_config.json")
@@ -85,8 +105,8 @@ def init():
     global tracer
     # tracer = app_logger.get_tracer(component_name=component_name)
     tracer = None
-    if os.getenv("LOCAL_DEPLOYMENT").lower() == "false":
-        redis_connect = get_redis_connection()
+    if os.getenv("Enable_Async_Scoring", "false").lower() == "true":
+        inference_executor = ThreadPoolExecutor(max_workers=int(os.getenv("Inference_Workers", str(os.cpu_count()))))
 
     logger.info('########## INIT Starting ########## v:4-07-2022 5:30PM')
     now = datetime.now()
@@ -111,11 +131,42 @@ def init():
     for lang in Debias_Models.keys():
         assert(Debias_Models[lang].is_fully_initialized())
 
+    # Workers are forked after the models are loaded so they share Debias_Models copy-on-write, and before the
+    # cache starts its connection, write-behind and key refresh threads so the children do not inherit their locks.
+    inference_processes = int(os.getenv("Inference_Processes", "0"))
+    if inference_processes > 0:
+        # the loaded objects move to the permanent generation, so the workers' collections do not write to their
+        # headers and copy the model pages after all
+        gc.collect()
+        gc.freeze()
+        inference_pool = InferencePool(inference_processes,
+                                       int(os.getenv("Inference_Max_Pending", str(4 * inference_processes))),
+                                       int(os.getenv("Inference_Submit_Timeout", "1000")) / 1000,
+                                       int(os.getenv("Inference_Task_Timeout", "30000")) / 1000)
+
+    if os.getenv("LOCAL_DEPLOYMENT").lower() == "false":
+        cache_options = CacheOptions()
+        redis_cache = RedisCache(cache_options)
+        logger.info(f"Cache keys namespaced with model version {cache_options.model_version}")
+        if os.getenv("Enable_Async_Scoring", "false").lower() == "true":
+            async_redis_cache = AsyncRedisCache(cache_options, redis_cache)
+
     #register the metrics expoter
     metrics_exporter = app_logger.get_metrics_exporter()
     view_manager.register_exporter(metrics_exporter)
     view_manager.register_view(reinflections_view)
     view_manager.register_view(requests_view)
+    if redis_cache is not None:
+        for cache_view in cache_views:
+            view_manager.register_view(cache_view)
+        redis_cache.metrics = CacheMetrics(stats_recorder)
+        if async_redis_cache is not None:
+            async_redis_cache.metrics = redis_cache.metrics
+    # per-stage timing of a sample of run() requests; off (no timing at all) unless the sample rate is above 0
+    stage_profile_sample_rate = float(os.getenv("Stage_Profile_Sample_Rate", "0"))
+    if stage_profile_sample_rate > 0:
+        view_manager.register_view(stage_latency_view)
+        stage_profiler = StageProfiler(stage_profile_sample_rate, int(os.getenv("Stage_Profile_Window", "60")), stats_recorder)
 
     logger.info('########## INIT END ########## v:2-15-2022 2:30PM')
     now = datetime.now()
@@ -138,20 +189,122 @@ class request_request_logger:
     def debug(self, message):
         logger.debug(self.add_trace_id(message))
 
+def is_test_request(aml_request):
+    #check is the header contains the string API-TEST and if so don't track it.
+    return "API-TEST" in aml_request.response_headers[client_traceid_response_header_name]
+
+def record_request_metrics(aml_request):
+    tmap_request = tag_map_module.TagMap()
+    tmap_request.insert("srcLanguage", aml_request.src_lang.value)
+    tmap_request.insert("tgtLanguage", aml_request.tgt_lang.value)
+    requests_view_measurement_map.measure_int_put(number_of_requests_measure, 1)
+    requests_view_measurement_map.record(tmap_request)
+
+def record_reinflection_metrics(aml_request):
+    tmap_reinflections = tag_map_module.TagMap()
+    tmap_reinflections.insert("srcLanguage", aml_request.src_lang.value)
+    tmap_reinflections.insert("tgtLanguage", aml_request.tgt_lang.value)
+    reinflections_view_measurement_map.measure_int_put(number_of_reinflections_measure, 1)
+    reinflections_view_measurement_map.record(tmap_reinflections)
+
+def get_tgt_dict(aml_request, reinflection_result, request_logger, trace_id):
+    if not reinflection_result.has_reinflection():
+        # reinflection was aborted for some reason
+        logger.debug (f"No reinflection. Reason = {reinflection_result.aborted_reason} ({trace_id})")
+        return {str(ApiGender.Neutral) : aml_request.tgt_text}, False
+
+    best_hyp_gender = reinflection_result.get_best_hyp_gender()
+    best_hyp = reinflection_result.get_best_hyp()
+    if best_hyp_gender == Gender.Ambiguous:
+        request_logger.debug(f"gender of the hypothesis was not clear, assuming orig_tgt is Masculine and reinflection is Feminine ({trace_id})")
+
+    masc_tgt = best_hyp             if best_hyp_gender == Gender.Male else aml_request.tgt_text
+    fem_tgt  = aml_request.tgt_text if best_hyp_gender == Gender.Male else best_hyp
+
+    tgt_dict = {
+        str(ApiGender.Feminine): fem_tgt,
+        str(ApiGender.Masculine): masc_tgt,
+    }
+    return tgt_dict, True
+
+def compute_reinflection(aml_request, trace_id):
+    # Runs in an inference pool worker when the pool is enabled; Debias_Models and logger are the parent's,
+    # inherited at fork. Only plain values are returned so the result pickles back to the front process.
+    model = Debias_Models[aml_request.tgt_lang]
+    request_logger = request_request_logger(logger, trace_id)
+    # with tracer.span(name='Debias_Models.get_reinflection_single_sentence'):
+    reinflection_result = model.get_reinflection_single_sentence(aml_request.src_text, aml_request.tgt_text, verbose=True, max_words=aml_request.options.max_words, max_hypotheses=aml_request.options.max_hypotheses, request_logger=request_logger)
+    tgt_dict, has_reinflection = get_tgt_dict(aml_request, reinflection_result, request_logger, trace_id)
+    debug_options = reinflection_result.debug_options() if aml_request.options.debug else None
+    return tgt_dict, has_reinflection, debug_options
+
+def get_reinflections(aml_requests, request_logger, trace_id):
+    # returns [(tgt_dict, has_reinflection, debug_options)]; with the inference pool all requests run in parallel
+    start_time = datetime.now()
+    if inference_pool is not None:
+        results = inference_pool.map(compute_reinflection, [(aml_request, trace_id) for aml_request in aml_requests])
+    else:
+        results = [compute_reinflection(aml_request, trace_id) for aml_request in aml_requests]
+    request_logger.info(f"reinflection complete. Time taken = {datetime.now() - start_time}")
+    return results
+
+def reinflect_many(aml_requests, request_logger, trace_id, profile=None):
+    responses = []
+    reinflections = get_reinflections(aml_requests, request_logger, trace_id)
+    if profile is not None:
+        profile.mark("reinflection")
+    for aml_request, (tgt_dict, has_reinflection, debug_options) in zip(aml_requests, reinflections):
+        # metrics are recorded here because the opencensus exporter thread only runs in the front process
+        if not is_test_request(aml_request):
+            record_request_metrics(aml_request)
+            if has_reinflection:
+                record_reinflection_metrics(aml_request)
+
+        result = GenderDebiasResponse(aml_request.src_text, tgt_dict)
+        if(aml_request.options.debug):
+            result =  GenderDebiasDebugResponse(aml_request.src_text, tgt_dict, debug_options)
+        api_response = get_json(result)
+
+        if aml_request.options.log_input is True:
+            request_logger.info(f"has_reinflection={has_reinflection}, Api_response={api_response}")
+        responses.append((api_response, tgt_dict))
+    if profile is not None:
+        profile.mark("response_json")
+    return responses
+
+def reinflect(aml_request, request_logger, trace_id, profile=None):
+    return reinflect_many([aml_request], request_logger, trace_id, profile)[0]
+
+def get_stage_profile():
+    # rolling per-stage latency statistics of the sampled requests, for debugging and the benchmark report
+    return stage_profiler.get_snapshot() if stage_profiler is not None else {}
+
+def service_unavailable_response(aml_request, request_logger, e):
+    error_code = 50300
+    request_logger.info(f"Inference pool unavailable: {e}. Errorcode:{error_code}")
+    api_response = get_json(GenderDebiasErrorResponse(error_code, "Service Unavailable"))
+    return AMLResponse(api_response, 503, aml_request.response_headers if aml_request else None)
+
+def is_batch_request(data):
+    return isinstance(data, str) and data.lstrip().startswith("[")
+
 def run(data):
+    if is_batch_request(data):
+        return run_batch(data)
     aml_request = None
+    profile = stage_profiler.start() if stage_profiler is not None else None
     try:
         trace_id = str(uuid4()) 
         request_logger = request_request_logger(logger, trace_id)
 
         request_logger.info(f'########## SCORE START ##########')
-        now = datetime.now()
-        request_logger.info(f"TIME: {now}")
         request_logger.info(f"Instance ID = {instance_id}, Machine info: {machine_info}")
 
         # validate and serialize request to aml_request object
         # with tracer.span("validate_request"):
         aml_request, errorResponse = validate_request(data, logger, trace_id)
+        if profile is not None:
+            profile.mark("validate_request")
         log_input = aml_request.options.log_input is True
         
         # return validation errors
@@ -162,6 +315,8 @@ def run(data):
         #return from hotfix if it has entries
         # with tracer.span(name='try_match_sentfix'):
         result = try_match_sentfix(model.sentfix_manager, aml_request.src_text, aml_request.tgt_text)
+        if profile is not None:
+            profile.mark("try_match_sentfix")
         if result is not None:
             api_response = get_json(result)
             if log_input:
@@ -169,91 +324,239 @@ def run(data):
             else:
                 request_logger.info((f'Matched sentfix but log input disabled'))
             return AMLResponse(api_response, 200, aml_request.response_headers)
+        # multi-sentence inputs are cached per sentence pair
+        if redis_cache is not None and cache_options.cache_flag == "true" and cache_options.segment_flag == "true" and not aml_request.options.debug:
+            segment_requests, separators = split_into_segments(aml_request)
+            if segment_requests is not None:
+                api_response = run_segmented(aml_request, segment_requests, separators, request_logger, trace_id)
+                if profile is not None:
+                    profile.mark("segmented")
+                request_logger.info(f'########## SCORE END ##########')
+                return AMLResponse(api_response, 200, aml_request.response_headers)
         #Cache Entry
-        if os.getenv("LOCAL_DEPLOYMENT").lower() == "false":
-            src_lang_str = str(aml_request.src_lang)
-            tgt_lang_str = str(aml_request.tgt_lang)
-            cache_key = GenerateCacheKey(src_lang_str, tgt_lang_str, aml_request.src_text, aml_request.tgt_text)
-            cache_log_flag = os.getenv("Cache_Debug")
-            if redis_connect is not None:
-                cached_response, get_latency = get_data_from_cache(redis_connect, cache_key)
-                if cached_response:
-                    if cache_log_flag.lower() == "true":
-                        logger.info("Retrieved response from cache, latency is: %.2f milliseconds" % get_latency)
-                        cached_response_obj = json.loads(cached_response)
-                        cached_response_obj["src_sentence"] = aml_request.src_text
-                        cached_response_obj["tgt"] = tgt_dict
-                        updated_cached_response = get_json(cached_response_obj)
-                        return AMLResponse(updated_cached_response, 200, aml_request.response_headers)
-        start_time = datetime.now()
-        # with tracer.span(name='Debias_Models.get_reinflection_single_sentence'):
-        reinflection_result = model.get_reinflection_single_sentence(aml_request.src_text, aml_request.tgt_text, verbose=True, max_words=aml_request.options.max_words, max_hypotheses=aml_request.options.max_hypotheses, request_logger=request_logger)
-        
-        request_logger.info(f"reinflection complete. Time taken = {datetime.now() - start_time}")
+        cached_response = None
+        cache_key = None
+        if redis_cache is not None:
+            cached_response, get_latency, cache_key, *_ = redis_cache.try_get_entry_from_cache(aml_request, redis_cache.redis_connect, trace_id, cache_options.cache_flag, profile)
+            if cached_response:
+                if cache_options.cache_log_flag == "true":
+                    request_logger.info("Retrieved response from cache, latency is: %.2f milliseconds" % get_latency)
+                return AMLResponse(cached_response, 200, aml_request.response_headers)
+
+        def reinflect_and_cache():
+            api_response, tgt_dict = reinflect(aml_request, request_logger, trace_id, profile)
+            # Set in Cache
+            if redis_cache is not None:
+                set_latency = redis_cache.try_set_entry_from_cache(cached_response, redis_cache.redis_connect, cache_key, tgt_dict, trace_id, cache_options.cache_flag, aml_request)
+                if profile is not None:
+                    profile.mark("cache_set")
+                if set_latency is not None and cache_options.cache_log_flag == "true":
+                    request_logger.info("Set request response to cache with expiration time, latency is: %.2f milliseconds" % set_latency)
+            return api_response, tgt_dict
+
+        # concurrent misses on the same key share one reinflection; debug responses carry per-request details
+        if cache_key is not None and not aml_request.options.debug:
+            api_response, tgt_dict = redis_cache.compute_once(aml_request, cache_key, reinflect_and_cache, trace_id)
+            if tgt_dict is None:
+                request_logger.info("Response shared from a concurrent reinflection of the same cache key")
+                if profile is not None:
+                    profile.mark("coalesced_wait")
+        else:
+            api_response, tgt_dict = reinflect_and_cache()
         request_logger.info(f'########## SCORE END ##########')
-        now = datetime.now()
-        request_logger.info(f"TIME: {now}")
-        has_reinflection = False
-
-        test_request = False    
-        #check is the header contains the string API-TEST and if so don't track it.
-        if "API-TEST" in aml_request.response_headers[client_traceid_response_header_name]:
-            test_request = True
-        
-        if not test_request:
-            tmap_request = tag_map_module.TagMap()
-            tmap_request.insert("srcLanguage", aml_request.src_lang.value)
-            tmap_request.insert("tgtLanguage", aml_request.tgt_lang.value)
-            requests_view_measurement_map.measure_int_put(number_of_requests_measure, 1)
-            requests_view_measurement_map.record(tmap_request)
-
-        if not reinflection_result.has_reinflection():
-            # reinflection was aborted for some reason
-            logger.debug (f"No reinflection. Reason = {reinflection_result.aborted_reason} ({trace_id})")
-            tgt_dict = {str(ApiGender.Neutral) : aml_request.tgt_text}
+        return AMLResponse(api_response, 200, aml_request.response_headers)
+    except InferencePoolUnavailable as e:
+        return service_unavailable_response(aml_request, request_logger, e)
+    except Exception as e:
+        error_code = 50000
+        request_logger.info(f"Unexpected exception {traceback.format_exc()}. Errorcode:{error_code}")
+        api_response = get_json(GenderDebiasErrorResponse(error_code, "Internal Server Error"))
+        return AMLResponse(api_response, 500, aml_request.response_headers)
+    finally:
+        if profile is not None:
+            profile.finish()
+
+def run_segmented(aml_request, segment_requests, separators, request_logger, trace_id):
+    # Every sentence pair is looked up in one MGET; only the uncached ones are reinflected and written back,
+    # and the per-sentence results are joined with the original target separators.
+    cache_entries = redis_cache.try_get_entries_from_cache(segment_requests, redis_cache.redis_connect, trace_id, cache_options.cache_flag, tgt_dicts=True)
+
+    tgt_dicts = [None] * len(segment_requests)
+    misses = []
+    duplicates = []
+    queued_keys = set()
+    for index, (segment_request, cache_entry) in enumerate(zip(segment_requests, cache_entries)):
+        cached_tgt_dict, get_latency, cache_key = cache_entry[:3]
+        if cached_tgt_dict:
+            tgt_dicts[index] = cached_tgt_dict
+        elif cache_key is not None and cache_key in queued_keys:
+            duplicates.append((index, cache_key))
         else:
-            if not test_request:
-                tmap_reinflections = tag_map_module.TagMap()
-                tmap_reinflections.insert("srcLanguage", aml_request.src_lang.value)
-                tmap_reinflections.insert("tgtLanguage", aml_request.tgt_lang.value)
-                reinflections_view_measurement_map.measure_int_put(number_of_reinflections_measure, 1)
-                reinflections_view_measurement_map.record(tmap_reinflections)
-
-            has_reinflection = True
-            best_hyp_gender = reinflection_result.get_best_hyp_gender()
-            best_hyp = reinflection_result.get_best_hyp()
-            if best_hyp_gender == Gender.Ambiguous:
-                request_logger.debug(f"gender of the hypothesis was not clear, assuming orig_tgt is Masculine and reinflection is Feminine ({trace_id})")
-
-            masc_tgt = best_hyp             if best_hyp_gender == Gender.Male else aml_request.tgt_text
-            fem_tgt  = aml_request.tgt_text if best_hyp_gender == Gender.Male else best_hyp
-            
-            tgt_dict = {
-                str(ApiGender.Feminine): fem_tgt,
-                str(ApiGender.Masculine): masc_tgt,
-            }
+            if cache_key is not None:
+                queued_keys.add(cache_key)
+            misses.append((index, cache_key))
+
+    new_entries = []
+    computed = {}
+    reinflections = get_reinflections([segment_requests[index] for index, _ in misses], request_logger, trace_id) if misses else []
+    for (index, cache_key), (tgt_dict, has_reinflection, debug_options) in zip(misses, reinflections):
+        tgt_dicts[index] = tgt_dict
+        if cache_key is not None:
+            computed[cache_key] = tgt_dict
+        new_entries.append((cache_key, tgt_dict, segment_requests[index]))
+    for index, cache_key in duplicates:
+        tgt_dicts[index] = computed[cache_key]
+    # counted like an unsegmented request: one request, and one reinflection if any sentence was reinflected
+    if not is_test_request(aml_request):
+        record_request_metrics(aml_request)
+        if any(has_reinflection for tgt_dict, has_reinflection, debug_options in reinflections):
+            record_reinflection_metrics(aml_request)
+    request_logger.info(f"Segments = {len(segment_requests)}, reinflected = {len(new_entries)}")
+
+    if new_entries:
+        set_latency = redis_cache.try_set_entries_from_cache(new_entries, redis_cache.redis_connect, trace_id, cache_options.cache_flag)
+        if set_latency is not None and cache_options.cache_log_flag == "true":
+            request_logger.info("Set %d segment responses to cache, latency is: %.2f milliseconds" % (len(new_entries), set_latency))
+
+    tgt_dict = merge_segment_tgt_dicts(tgt_dicts, separators)
+    api_response = get_json(GenderDebiasResponse(aml_request.src_text, tgt_dict))
+    if aml_request.options.log_input is True:
+        request_logger.info(f"segmented Api_response={api_response}")
+    return api_response
+
+def run_batch(data):
+    # A batch is a JSON array of single requests. Every cache lookup is done in one MGET and every
+    # new result is written back in one pipeline; the response is the array of single responses.
+    aml_request = None
+    try:
+        trace_id = str(uuid4())
+        request_logger = request_request_logger(logger, trace_id)
 
-        result = GenderDebiasResponse(aml_request.src_text, tgt_dict)
-        if(aml_request.options.debug):
-            result =  GenderDebiasDebugResponse(aml_request.src_text, tgt_dict, reinflection_result.debug_options())
-        api_response = get_json(result)
+        request_logger.info(f'########## BATCH SCORE START ##########')
+        items = json.loads(data)
+        request_logger.info(f"Batch size = {len(items)}, Instance ID = {instance_id}")
+
+        aml_requests = []
+        for index, item in enumerate(items):
+            aml_request, errorResponse = validate_request(json.dumps(item), logger, trace_id)
+            # the whole batch is rejected with the first validation error
+            if(errorResponse is not None):
+                request_logger.info(f"Batch entry {index} failed validation")
+                return errorResponse
+            aml_requests.append(aml_request)
+        if not aml_requests:
+            return AMLResponse("[]", 200, None)
+
+        api_responses = [None] * len(aml_requests)
+        pending = []
+        for index, aml_request in enumerate(aml_requests):
+            model = Debias_Models[aml_request.tgt_lang]
+            result = try_match_sentfix(model.sentfix_manager, aml_request.src_text, aml_request.tgt_text)
+            if result is not None:
+                api_responses[index] = get_json(result)
+            else:
+                pending.append(index)
+
+        cache_entries = [(None, None, None)] * len(pending)
+        if redis_cache is not None and pending:
+            cache_entries = redis_cache.try_get_entries_from_cache([aml_requests[index] for index in pending], redis_cache.redis_connect, trace_id, cache_options.cache_flag)
+
+        misses = []
+        duplicates = []
+        queued_keys = set()
+        for index, cache_entry in zip(pending, cache_entries):
+            cached_response, get_latency, cache_key = cache_entry[:3]
+            if cached_response:
+                api_responses[index] = cached_response
+                continue
+            # repeated segments within the batch are reinflected once
+            if cache_key is not None and cache_key in queued_keys and not aml_requests[index].options.debug:
+                duplicates.append((index, cache_key))
+                continue
+            if cache_key is not None:
+                queued_keys.add(cache_key)
+            misses.append((index, cache_key))
+
+        # all misses are reinflected together so they spread over the inference pool workers
+        new_entries = []
+        computed = {}
+        reinflections = reinflect_many([aml_requests[index] for index, _ in misses], request_logger, trace_id) if misses else []
+        for (index, cache_key), (api_response, tgt_dict) in zip(misses, reinflections):
+            api_responses[index] = api_response
+            if cache_key is not None:
+                computed[cache_key] = tgt_dict
+            new_entries.append((cache_key, tgt_dict, aml_requests[index]))
+        for index, cache_key in duplicates:
+            api_responses[index] = get_json(GenderDebiasResponse(aml_requests[index].src_text, computed[cache_key]))
+        request_logger.info(f"Batch cache hits = {len(pending) - len(new_entries)}, reinflections = {len(new_entries)}")
+
+        if redis_cache is not None and new_entries:
+            set_latency = redis_cache.try_set_entries_from_cache(new_entries, redis_cache.redis_connect, trace_id, cache_options.cache_flag)
+            if set_latency is not None and cache_options.cache_log_flag == "true":
+                request_logger.info("Set %d batch responses to cache, latency is: %.2f milliseconds" % (len(new_entries), set_latency))
+
+        request_logger.info(f'########## BATCH SCORE END ##########')
+        return AMLResponse("[" + ",".join(api_responses) + "]", 200, aml_requests[0].response_headers)
+    except InferencePoolUnavailable as e:
+        return service_unavailable_response(aml_request, request_logger, e)
+    except Exception as e:
+        error_code = 50000
+        request_logger.info(f"Unexpected exception {traceback.format_exc()}. Errorcode:{error_code}")
+        api_response = get_json(GenderDebiasErrorResponse(error_code, "Internal Server Error"))
+        return AMLResponse(api_response, 500, aml_request.response_headers if aml_request else None)
 
-        if log_input:
-            request_logger.info(f"has_reinflection={has_reinflection}, Api_response={api_response}")
+async def run_async(data):
+    # Same contract as run() for event-loop based front ends: the cache lookup overlaps with sentfix
+    # matching and reinflection runs on inference_executor, so the loop keeps serving other requests.
+    aml_request = None
+    try:
+        trace_id = str(uuid4())
+        request_logger = request_request_logger(logger, trace_id)
+
+        request_logger.info(f'########## ASYNC SCORE START ##########')
+        aml_request, errorResponse = validate_request(data, logger, trace_id)
+        if(errorResponse is not None):
+            return errorResponse
+        log_input = aml_request.options.log_input is True
 
-        # Set in Cache
-        if os.getenv("LOCAL_DEPLOYMENT").lower() == "false":
-            if cached_response is None:
-                tgt_part_str = str(tgt_dict)
-                set_latency = set_data_in_cache(redis_connect, cache_key, tgt_part_str, os.getenv("Cache_expiration_time"))
-                if cache_log_flag == "true": 
-                    logger.info("Set request response to cache with expiration time, latency is: %.2f milliseconds" % set_latency)
+        loop = asyncio.get_running_loop()
+        model = Debias_Models[aml_request.tgt_lang]
+        sentfix_lookup = loop.run_in_executor(None, try_match_sentfix, model.sentfix_manager, aml_request.src_text, aml_request.tgt_text)
+        cached_response = None
+        cache_key = None
+        if async_redis_cache is not None:
+            result, cache_entry = await asyncio.gather(sentfix_lookup, async_redis_cache.try_get_entry_from_cache(aml_request, async_redis_cache.redis_connect, trace_id, cache_options.cache_flag))
+            cached_response, get_latency, cache_key = cache_entry[:3]
+        else:
+            result = await sentfix_lookup
+
+        if result is not None:
+            api_response = get_json(result)
+            if log_input:
+                request_logger.info(f'Matched sentfix for {aml_request.src_text} -- api_response={api_response}')
+            else:
+                request_logger.info((f'Matched sentfix but log input disabled'))
+            return AMLResponse(api_response, 200, aml_request.response_headers)
+        if cached_response:
+            if cache_options.cache_log_flag == "true":
+                request_logger.info("Retrieved response from cache, latency is: %.2f milliseconds" % get_latency)
+            return AMLResponse(cached_response, 200, aml_request.response_headers)
+
+        api_response, tgt_dict = await loop.run_in_executor(inference_executor, functools.partial(reinflect, aml_request, request_logger, trace_id))
+        request_logger.info(f'########## ASYNC SCORE END ##########')
+
+        if async_redis_cache is not None:
+            set_latency = await async_redis_cache.try_set_entry_from_cache(cached_response, async_redis_cache.redis_connect, cache_key, tgt_dict, trace_id, cache_options.cache_flag, aml_request)
+            if set_latency is not None and cache_options.cache_log_flag == "true":
+                request_logger.info("Set request response to cache with expiration time, latency is: %.2f milliseconds" % set_latency)
         return AMLResponse(api_response, 200, aml_request.response_headers)
+    except InferencePoolUnavailable as e:
+        return service_unavailable_response(aml_request, request_logger, e)
     except Exception as e:
         error_code = 50000
         request_logger.info(f"Unexpected exception {traceback.format_exc()}. Errorcode:{error_code}")
         api_response = get_json(GenderDebiasErrorResponse(error_code, "Internal Server Error"))
-        return AMLResponse(api_response, 500, aml_request.response_headers)
+        return AMLResponse(api_response, 500, aml_request.response_headers if aml_request else None)
 
 def try_match_sentfix(sentfix_manager, src, orig_tgt):
         sentfix_result = sentfix_manager.try_match_sentfix(src)
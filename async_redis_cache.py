@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import threading
+import time
+import redis.asyncio as aioredis
+from redis.asyncio.connection import SSLConnection
+from redis.asyncio.retry import Retry
+from redis.backoff import NoBackoff
+from redis_cache import RedisCache
+from cache_keys import parse_generations
+from async_redis_shards import AsyncCacheRedisCluster, AsyncShardedRedis, async_disconnect_client
+class AsyncRedisCache(RedisCache):
+    # redis.asyncio counterpart of RedisCache. Only the Redis client and the calls that touch Redis are its own:
+    # the L1 cache, circuit breaker, key builder, write-behind queue, admission sketch and Azure credential are the
+    # ones of redis_cache, so the memory budget is not doubled and an outage seen on either path opens one breaker.
+    def __init__(self, cache_options, redis_cache):
+        self.cache_options = cache_options
+        self.redis_cache = redis_cache
+        self.local_cache = redis_cache.local_cache
+        self.value_codec = redis_cache.value_codec
+        self.circuit_breaker = redis_cache.circuit_breaker
+        self.shard_breakers = redis_cache.shard_breakers
+        self.credential = None
+        self.redis_connect = None
+        self.write_behind = redis_cache.write_behind
+        self.key_builder = redis_cache.key_builder
+        self.single_flight = redis_cache.single_flight
+        self.metrics = redis_cache.metrics
+        self.admission_policy = redis_cache.admission_policy
+        self.loop = None
+        self.connection_thread = threading.Thread(target=self.maintain_connection, name="async-redis-connection", daemon=True)
+        self.connection_thread.start()
+
+    def get_credential(self):
+        return self.redis_cache.get_credential()
+
+    def remember_loop(self):
+        # redis.asyncio connections belong to the event loop that opened them
+        self.loop = asyncio.get_running_loop()
+
+    def close_connection(self, redis_connect):
+        # called from the drain timer thread; a client that was never used has no connections to close
+        if self.loop is None or self.loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self.close_client(redis_connect), self.loop)
+
+    async def close_client(self, redis_connect):
+        try:
+            await async_disconnect_client(redis_connect)
+        except Exception as e:
+            logging.error("Failed to close replaced async Redis connection pool: %s", str(e))
+
+    def create_redis_client(self, redis_host, redis_port, user_name, password):
+        pool = aioredis.BlockingConnectionPool(
+            connection_class=SSLConnection,
+            retry=Retry(NoBackoff(), 0),
+            **self.get_connection_kwargs(redis_host, redis_port, user_name, password)
+        )
+        return aioredis.Redis(connection_pool=pool)
+
+    def create_cluster_client(self, redis_host, redis_port, user_name, password):
+        return AsyncCacheRedisCluster(retry=Retry(NoBackoff(), 0), **self.get_cluster_kwargs(redis_host, redis_port, user_name, password))
+
+    def create_sharded_client(self, shards):
+        return AsyncShardedRedis(shards, self.cache_options.read_from_replicas == "true",
+                                 self.key_builder.get_generation_key_prefix().encode("utf-8"))
+
+    async def fetch_generations(self, generation_keys):
+        # the sync key builder would block the event loop on its generation read; its refresher thread keeps
+        # the memoized prefixes current
+        redis_connect = self.redis_connect
+        if not redis_connect or self.circuit_breaker.is_open():
+            return None
+        try:
+            return parse_generations(await redis_connect.mget(generation_keys))
+        except Exception as e:
+            logging.error("Failed to async read cache key generations: %s", str(e))
+            return None
+
+    async def GenerateCacheKey(self, src_lang, tgt_lang, source_fast_words, orig_tgt_fast_words):
+        prefix = self.key_builder.get_memoized_prefix(src_lang, tgt_lang)
+        if prefix is None:
+            generation_keys = self.key_builder.get_generation_keys(src_lang, tgt_lang)
+            prefix = self.key_builder.update_prefix(src_lang, tgt_lang, generation_keys, await self.fetch_generations(generation_keys))
+        return prefix + self.key_builder.get_digest(source_fast_words, orig_tgt_fast_words)
+
+    async def get_data_from_cache(self, r, key, trace_id, languages=None):
+        if not self.circuit_breaker.allow_request():
+            return None, None
+        try:
+            start_time = time.time()
+            value = await r.get(key)
+            latency = round((time.time() - start_time) * 1000, 2)
+            self.circuit_breaker.record_success()
+            if self.metrics is not None:
+                self.metrics.record_get_latency(languages, latency)
+            if value is not None:
+                return value, latency
+            else:
+                return None, latency
+        except Exception as e:
+            self.record_call_error(e, languages, "async get data in cache", trace_id)
+            return None, None
+
+    async def set_data_in_cache(self, r, key, value, trace_id, expiration_time=None, languages=None):
+        if not self.circuit_breaker.allow_request():
+            return None
+        try:
+            start_time = time.time()
+            if expiration_time is not None:
+                await r.setex(key, expiration_time, value)
+            else:
+                await r.set(key, value)
+            latency = round((time.time() - start_time) * 1000, 2)
+            self.circuit_breaker.record_success()
+            return latency
+        except Exception as e:
+            self.record_call_error(e, languages, "async set data in cache", trace_id)
+            return None
+
+    async def set_data_in_cache_batch(self, r, items, trace_id, expiration_time=None, languages=None):
+        if not self.circuit_breaker.allow_request():
+            return None
+        try:
+            start_time = time.time()
+            await self.build_pipeline(r, items, expiration_time).execute()
+            latency = round((time.time() - start_time) * 1000, 2)
+            self.circuit_breaker.record_success()
+            return latency
+        except Exception as e:
+            self.record_call_error(e, languages, "async batch set data in cache", trace_id)
+            return None
+
+    async def extend_expirations(self, redis_connect, cache_keys, trace_id):
+        if self.admission_policy is None:
+            return
+        items = self.get_expiration_extensions(cache_keys)
+        if not items:
+            return
+        if self.write_behind is not None:
+            for cache_key, value, expiration_time in items:
+                self.write_behind.put(cache_key, value, expiration_time)
+        elif redis_connect:
+            await self.set_data_in_cache_batch(redis_connect, items, trace_id)
+
+    async def try_get_entry_from_cache(self, aml_request, redis_connect, trace_id, cache_flag):
+        self.remember_loop()
+        source_fast_words, orig_tgt_fast_words, space_norm_source, space_norm_orig_tgt = self.normalized_sentence(aml_request.src_text, aml_request.tgt_text)
+        if cache_flag == "true":
+            src_lang_str = str(aml_request.src_lang)
+            tgt_lang_str = str(aml_request.tgt_lang)
+            if redis_connect or self.local_cache is not None:
+                languages = self.get_languages(aml_request)
+                cache_key = await self.GenerateCacheKey(src_lang_str, tgt_lang_str, source_fast_words, orig_tgt_fast_words)
+                cached_response, get_latency = self.get_data_from_local_cache(cache_key)
+                cache_tier = "l1"
+                if cached_response is None and redis_connect:
+                    cache_tier = "redis"
+                    cached_response, get_latency = await self.get_data_from_cache(redis_connect, cache_key, trace_id, languages)
+                    if cached_response:
+                        self.set_data_in_local_cache(cache_key, cached_response)
+                updated_cached_response_str = self.finish_lookup(aml_request, languages, cached_response, cache_tier)
+                if updated_cached_response_str is not None:
+                    await self.extend_expirations(redis_connect, [cache_key], trace_id)
+                    return updated_cached_response_str, get_latency, cache_key, source_fast_words, orig_tgt_fast_words, space_norm_source, space_norm_orig_tgt
+                return None, None, cache_key, source_fast_words, orig_tgt_fast_words, space_norm_source, space_norm_orig_tgt
+            logging.error("Async Cache Get: No Cache Redis Connection was established.")
+        return None, None, None, source_fast_words, orig_tgt_fast_words, space_norm_source, space_norm_orig_tgt
+
+    async def try_set_entry_from_cache(self, updated_cached_response_str, redis_connect, cache_key, tgt_dict, trace_id,
+                                       cache_flag, aml_request=None):
+        if cache_flag == "true":
+            if updated_cached_response_str is None and cache_key is not None:
+                languages = self.get_languages(aml_request) if aml_request is not None else None
+                tgt_part_str, admit, expiration_time = self.prepare_write(cache_key, tgt_dict)
+                if not admit:
+                    return None
+                if self.write_behind is not None:
+                    self.queue_entry(cache_key, tgt_part_str, expiration_time, languages)
+                    return None
+                if redis_connect:
+                    set_latency = await self.set_data_in_cache(redis_connect, cache_key, tgt_part_str, trace_id, expiration_time, languages)
+                    self.record_set(languages, set_latency, tgt_part_str)
+                    return set_latency
+            if not redis_connect:
+                logging.error("Async Cache Set: No Cache Redis Connection was established.")
+        else:
+            logging.error("Cache not enabled or not an online deployment.")
+        return None
@@ -0,0 +1,110 @@
+import logging
+from redis.asyncio.cluster import RedisCluster
+from redis_shards import ShardedRedis, ShardedPipeline, REDIS_ERRORS, is_pool_exhausted
+
+
+async def async_disconnect_client(redis_connect):
+    if isinstance(redis_connect, (AsyncShardedRedis, RedisCluster)):
+        await redis_connect.aclose()
+    else:
+        # the pool was passed in explicitly, so the client does not close it by default
+        await redis_connect.aclose(close_connection_pool=True)
+
+
+class AsyncCacheRedisCluster(RedisCluster):
+    async def mget(self, keys, *args):
+        return await self.mget_nonatomic(keys, *args)
+
+
+class AsyncShardedRedis(ShardedRedis):
+    # redis.asyncio counterpart of ShardedRedis; ring placement and shard health are shared, only the calls are coroutines.
+    async def call(self, circuit_breaker, fn, *args, **kwargs):
+        try:
+            result = await fn(*args, **kwargs)
+        except REDIS_ERRORS as e:
+            if not is_pool_exhausted(e):
+                circuit_breaker.record_failure()
+            raise
+        circuit_breaker.record_success()
+        return result
+
+    async def read(self, shard, method, *args):
+        if self.read_from_replicas:
+            replica = shard.get_replica()
+            if replica is not None:
+                client, circuit_breaker = replica
+                try:
+                    return await self.call(circuit_breaker, getattr(client, method), *args)
+                except REDIS_ERRORS as e:
+                    logging.error("Async replica read on shard %s failed, falling back to the primary: %s", shard.name, str(e))
+        return await self.call(shard.circuit_breaker, getattr(shard.primary, method), *args)
+
+    async def write(self, key, method, *args, **kwargs):
+        shard = self.get_shard(key)
+        return await self.call(shard.circuit_breaker, getattr(shard.primary, method), *args, **kwargs)
+
+    async def get(self, key):
+        return await self.read(self.get_shard(key), "get", key)
+
+    async def mget(self, keys):
+        values = [None] * len(keys)
+        groups = self.group_by_shard(keys)
+        failures = 0
+        for shard, indexes in groups:
+            try:
+                shard_values = await self.read(shard, "mget", [keys[index] for index in indexes])
+            except REDIS_ERRORS as e:
+                logging.error("Async MGET on shard %s failed: %s", shard.name, str(e))
+                failures += 1
+                if failures == len(groups):
+                    raise
+                continue
+            for index, value in zip(indexes, shard_values):
+                values[index] = value
+        return values
+
+    async def set(self, key, value, **kwargs):
+        return await self.write(key, "set", key, value, **kwargs)
+
+    async def setex(self, key, time, value):
+        return await self.write(key, "setex", key, time, value)
+
+    async def expire(self, key, time):
+        return await self.write(key, "expire", key, time)
+
+    async def incr(self, key):
+        return await self.write(key, "incr", key)
+
+    async def eval(self, script, numkeys, *keys_and_args):
+        return await self.write(keys_and_args[0], "eval", script, numkeys, *keys_and_args)
+
+    def pipeline(self, transaction=False):
+        return AsyncShardedPipeline(self)
+
+    async def aclose(self):
+        for shard in self.shards:
+            for client in shard.get_clients():
+                await async_disconnect_client(client)
+
+
+class AsyncShardedPipeline(ShardedPipeline):
+    async def execute(self):
+        commands, self.commands = self.commands, []
+        results = [None] * len(commands)
+        error = None
+        for shard, indexes in self.sharded_redis.group_by_shard([args[0] for _, args, _ in commands]):
+            pipe = shard.primary.pipeline(transaction=False)
+            for index in indexes:
+                method, args, kwargs = commands[index]
+                getattr(pipe, method)(*args, **kwargs)
+            try:
+                shard_results = await self.sharded_redis.call(shard.circuit_breaker, pipe.execute)
+            except REDIS_ERRORS as e:
+                logging.error("Async pipeline on shard %s failed: %s", shard.name, str(e))
+                error = e
+                continue
+            for index, result in zip(indexes, shard_results):
+                results[index] = result
+        if error is not None:
+            raise error
+        return results
@@ -0,0 +1,409 @@
+import argparse
+import bisect
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Reproducible benchmark for the scoring + cache path. It runs aml_scorer.run() against an in-process fake Redis
+# (or a local redis-server with --redis-url) and a stub reinflection model with configurable latency, replays a
+# Zipf-distributed sentence workload at a configurable concurrency and prints a JSON report that can be diffed
+# across commits.
+#
+#   python cache_benchmark.py --requests 20000 --concurrency 16 --output bench.json
+#
+# Cache behaviour follows the usual environment variables (Enable_L1_Cache, Cache_Write_Behind, ...); the
+# benchmark only provides defaults for the ones CacheOptions requires.
+
+os.environ.setdefault("Enable_Cache", "true")
+os.environ.setdefault("Cache_Debug", "false")
+os.environ.setdefault("Timeout", "1000")
+os.environ.setdefault("Cache_expiration_time", "3600")
+os.environ.setdefault("LOCAL_DEPLOYMENT", "false")
+
+import aml_scorer
+from api_interfaces import ApiGender
+from gender import Gender
+from logger import get_disabled_logger
+from redis_cache import CacheOptions, RedisCache
+from stage_profiler import StageProfiler
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def set(self, *args, **kwargs):
+        self.commands.append(("set", args, kwargs))
+        return self
+
+    def setex(self, *args, **kwargs):
+        self.commands.append(("setex", args, kwargs))
+        return self
+
+    def expire(self, *args, **kwargs):
+        self.commands.append(("expire", args, kwargs))
+        return self
+
+    def execute(self):
+        self.client.round_trip()
+        return [getattr(self.client, name)(*args, counted=False, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    # In-process stand-in for the subset of redis.Redis the cache uses; every command or pipeline execution
+    # counts as one round trip and optionally sleeps for a simulated network latency.
+    def __init__(self, latency_ms=0):
+        self.latency = latency_ms * 0.001
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+        self.round_trips = 0
+        self.connection_pool = self
+
+    def disconnect(self, inuse_connections=True):
+        pass
+
+    def round_trip(self):
+        with self.lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def encode(self, value):
+        return value if isinstance(value, bytes) else str(value).encode("utf-8")
+
+    def lookup(self, key):
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def get(self, key, counted=True):
+        if counted:
+            self.round_trip()
+        with self.lock:
+            return self.lookup(key)
+
+    def mget(self, keys, counted=True):
+        if counted:
+            self.round_trip()
+        with self.lock:
+            return [self.lookup(key) for key in keys]
+
+    def set(self, key, value, nx=False, px=None, ex=None, counted=True):
+        if counted:
+            self.round_trip()
+        with self.lock:
+            if nx and self.lookup(key) is not None:
+                return None
+            self.data[key] = self.encode(value)
+            self.expires.pop(key, None)
+            if px is not None:
+                self.expires[key] = time.monotonic() + px * 0.001
+            if ex is not None:
+                self.expires[key] = time.monotonic() + int(ex)
+            return True
+
+    def setex(self, key, expiration_time, value, counted=True):
+        return self.set(key, value, ex=expiration_time, counted=counted)
+
+    def expire(self, key, expiration_time, counted=True):
+        if counted:
+            self.round_trip()
+        with self.lock:
+            if self.lookup(key) is None:
+                return False
+            self.expires[key] = time.monotonic() + int(expiration_time)
+            return True
+
+    def incr(self, key, counted=True):
+        if counted:
+            self.round_trip()
+        with self.lock:
+            value = int(self.lookup(key) or 0) + 1
+            self.data[key] = self.encode(value)
+            return value
+
+    def eval(self, script, numkeys, key, token, counted=True):
+        # only the lease release script is used: delete the key if it still holds our token
+        if counted:
+            self.round_trip()
+        with self.lock:
+            if self.lookup(key) == self.encode(token):
+                del self.data[key]
+                return 1
+            return 0
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class CountingRedis:
+    # wraps a real redis.Redis client and counts round trips the same way FakeRedis does
+    def __init__(self, client):
+        self.client = client
+        self.lock = threading.Lock()
+        self.round_trips = 0
+        self.connection_pool = client.connection_pool
+
+    def count(self):
+        with self.lock:
+            self.round_trips += 1
+
+    def pipeline(self, transaction=True):
+        pipe = self.client.pipeline(transaction=transaction)
+        execute = pipe.execute
+        def counted_execute(*args, **kwargs):
+            self.count()
+            return execute(*args, **kwargs)
+        pipe.execute = counted_execute
+        return pipe
+
+    def __getattr__(self, name):
+        attr = getattr(self.client, name)
+        if not callable(attr):
+            return attr
+        def counted(*args, **kwargs):
+            self.count()
+            return attr(*args, **kwargs)
+        return counted
+
+
+class BenchmarkRedisCache(RedisCache):
+    def __init__(self, cache_options, client):
+        self.benchmark_client = client
+        super().__init__(cache_options)
+
+    def get_redis_connection(self):
+        return self.benchmark_client, time.time() + 24 * 3600
+
+
+class StubReinflectionResult:
+    def __init__(self, tgt_text):
+        self.tgt_text = tgt_text
+        self.aborted_reason = None
+
+    def has_reinflection(self):
+        return True
+
+    def get_best_hyp_gender(self):
+        return Gender.Female
+
+    def get_best_hyp(self):
+        return self.tgt_text.replace("El ", "La ")
+
+    def debug_options(self):
+        return {}
+
+
+class StubSentfixManager:
+    def try_match_sentfix(self, src):
+        return None
+
+
+class StubModel:
+    def __init__(self, latency_ms):
+        self.latency = latency_ms * 0.001
+        self.sentfix_manager = StubSentfixManager()
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def get_reinflection_single_sentence(self, src_text, tgt_text, **kwargs):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return StubReinflectionResult(tgt_text)
+
+
+def make_sentence_pair(index):
+    return (f"The doctor number {index} is going home as he is tired.",
+            f"El doctor número {index} se va a casa porque está cansado.")
+
+
+def make_request(src_lang, tgt_lang, index):
+    src_text, tgt_text = make_sentence_pair(index)
+    return json.dumps({"source": {"language": src_lang, "text": src_text},
+                       "target": {"language": tgt_lang, "text": tgt_text}})
+
+
+def zipf_workload(num_requests, num_sentences, exponent, seed):
+    weights = [1.0 / (rank ** exponent) for rank in range(1, num_sentences + 1)]
+    cumulative = []
+    total = 0.0
+    for weight in weights:
+        total += weight
+        cumulative.append(total)
+    rng = random.Random(seed)
+    return [bisect.bisect_left(cumulative, rng.random() * total) for _ in range(num_requests)]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def latency_summary(latencies_ms):
+    latencies_ms = sorted(latencies_ms)
+    return {
+        "mean_ms": round(sum(latencies_ms) / len(latencies_ms), 4) if latencies_ms else None,
+        "p50_ms": percentile(latencies_ms, 0.50),
+        "p95_ms": percentile(latencies_ms, 0.95),
+        "p99_ms": percentile(latencies_ms, 0.99),
+        "max_ms": latencies_ms[-1] if latencies_ms else None,
+    }
+
+
+def time_call(fn, iterations):
+    latencies_ms = []
+    for _ in range(iterations):
+        start = time.perf_counter_ns()
+        fn()
+        latencies_ms.append((time.perf_counter_ns() - start) / 1e6)
+    return latency_summary(latencies_ms)
+
+
+def get_round_trips(client):
+    return client.round_trips
+
+
+def setup_scorer(args):
+    if args.redis_url:
+        import redis
+        client = CountingRedis(redis.Redis.from_url(args.redis_url))
+        client.flushdb()
+        client.round_trips = 0
+    else:
+        client = FakeRedis(args.redis_latency_ms)
+    cache_options = CacheOptions()
+    redis_cache = BenchmarkRedisCache(cache_options, client)
+    deadline = time.monotonic() + 10
+    while not redis_cache.is_ready() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    model = StubModel(args.model_latency_ms)
+    aml_scorer.logger = get_disabled_logger().get_logger(component_name=aml_scorer.component_name)
+    aml_scorer.instance_id = "benchmark"
+    aml_scorer.machine_info = "benchmark"
+    aml_scorer.cache_options = cache_options
+    aml_scorer.redis_cache = redis_cache
+    return client, redis_cache, model
+
+
+def run_micro_benchmarks(args, redis_cache):
+    # sentence indices outside the workload so the load test starts with a cold cache
+    validated, error = aml_scorer.validate_request(make_request(args.src_lang, args.tgt_lang, -1), aml_scorer.logger, "benchmark")
+    missing, error = aml_scorer.validate_request(make_request(args.src_lang, args.tgt_lang, -2), aml_scorer.logger, "benchmark")
+    source_fast_words, orig_tgt_fast_words, _, _ = redis_cache.normalized_sentence(validated.src_text, validated.tgt_text)
+    src_lang_str = str(validated.src_lang)
+    tgt_lang_str = str(validated.tgt_lang)
+    cache_flag = redis_cache.cache_options.cache_flag
+
+    cached_response, _, cache_key = redis_cache.try_get_entry_from_cache(validated, redis_cache.redis_connect, "benchmark", cache_flag)[:3]
+    redis_cache.try_set_entry_from_cache(cached_response, redis_cache.redis_connect, cache_key,
+                                         {str(ApiGender.Feminine): validated.tgt_text, str(ApiGender.Masculine): validated.tgt_text},
+                                         "benchmark", cache_flag, validated)
+    if redis_cache.write_behind is not None:
+        time.sleep(redis_cache.cache_options.write_behind_flush_interval * 2)
+    return {
+        "normalized_sentence": time_call(lambda: redis_cache.normalized_sentence(validated.src_text, validated.tgt_text), args.micro_iterations),
+        "GenerateCacheKey": time_call(lambda: redis_cache.GenerateCacheKey(src_lang_str, tgt_lang_str, source_fast_words, orig_tgt_fast_words), args.micro_iterations),
+        "cache_hit": time_call(lambda: redis_cache.try_get_entry_from_cache(validated, redis_cache.redis_connect, "benchmark", cache_flag), args.micro_iterations),
+        "cache_miss": time_call(lambda: redis_cache.try_get_entry_from_cache(missing, redis_cache.redis_connect, "benchmark", cache_flag), args.micro_iterations),
+    }
+
+
+def run_load_test(args, client, model):
+    workload = zipf_workload(args.requests, args.sentences, args.zipf_exponent, args.seed)
+    requests = [make_request(args.src_lang, args.tgt_lang, index) for index in workload]
+    latencies_ms = [None] * len(requests)
+    errors = []
+
+    def send(position):
+        start = time.perf_counter_ns()
+        response = aml_scorer.run(requests[position])
+        latencies_ms[position] = (time.perf_counter_ns() - start) / 1e6
+        if getattr(response, "status_code", 200) != 200:
+            errors.append(position)
+
+    round_trips_before = get_round_trips(client)
+    calls_before = model.calls
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(send, range(len(requests))))
+    elapsed = time.perf_counter() - start
+    reinflections = model.calls - calls_before
+    result = {
+        "requests": len(requests),
+        "distinct_sentences": len(set(workload)),
+        "elapsed_s": round(elapsed, 4),
+        "throughput_rps": round(len(requests) / elapsed, 2),
+        "errors": len(errors),
+        "hit_ratio": round(1 - reinflections / len(requests), 4),
+        "reinflections": reinflections,
+        "redis_round_trips_per_request": round((get_round_trips(client) - round_trips_before) / len(requests), 4),
+    }
+    result.update(latency_summary(latencies_ms))
+    return result
+
+
+def get_git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark aml_scorer.run() and the Redis cache path.")
+    parser.add_argument("--requests", type=int, default=10000, help="requests in the load test")
+    parser.add_argument("--sentences", type=int, default=2000, help="distinct sentence pairs in the workload")
+    parser.add_argument("--zipf-exponent", type=float, default=1.1, help="skew of the sentence popularity")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent callers of run()")
+    parser.add_argument("--model-latency-ms", type=float, default=20, help="latency of the stub reinflection model")
+    parser.add_argument("--redis-latency-ms", type=float, default=0.5, help="simulated round trip latency of the fake Redis")
+    parser.add_argument("--redis-url", help="benchmark against this Redis instead of the in-process fake; the db is flushed")
+    parser.add_argument("--micro-iterations", type=int, default=2000, help="iterations of each micro benchmark")
+    parser.add_argument("--src-lang", default="en")
+    parser.add_argument("--tgt-lang", default="es")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--stage-profile-sample-rate", type=float, default=0, help="fraction of load test requests timed per stage")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    client, redis_cache, model = setup_scorer(args)
+    report = {"commit": get_git_commit(), "config": vars(args)}
+    report["micro"] = run_micro_benchmarks(args, redis_cache)
+    validated, error = aml_scorer.validate_request(make_request(args.src_lang, args.tgt_lang, -1), aml_scorer.logger, "benchmark")
+    aml_scorer.Debias_Models = {validated.tgt_lang: model}
+    if args.stage_profile_sample_rate > 0:
+        # one window spanning the whole load test
+        aml_scorer.stage_profiler = StageProfiler(args.stage_profile_sample_rate, 24 * 3600)
+    report["load"] = run_load_test(args, client, model)
+    if aml_scorer.stage_profiler is not None:
+        report["stages"] = aml_scorer.get_stage_profile()
+    if redis_cache.local_cache is not None:
+        report["l1_cache"] = redis_cache.local_cache.get_stats()
+    if redis_cache.write_behind is not None:
+        report["write_behind"] = redis_cache.write_behind.get_stats()
+    if redis_cache.admission_policy is not None:
+        report["admission"] = {"rejected_writes": redis_cache.admission_policy.rejected}
+
+    report_json = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            output.write(report_json + "\n")
+    else:
+        print(report_json)
+
+
+if __name__ == "__main__":
+    main()
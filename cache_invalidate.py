@@ -0,0 +1,51 @@
+import argparse
+import logging
+import os
+from languages import abbrev_to_lang
+from redis_cache import CacheOptions, RedisCache
+
+# Invalidates cached reinflections by bumping a generation counter, e.g. after a sentfix or model data change that
+# does not come with a new model version. Every replica moves to the new key space within
+# Cache_Generation_Refresh_Interval seconds; the orphaned entries expire on their own.
+#
+#   python cache_invalidate.py --src-lang en --tgt-lang es     # one language pair
+#   python cache_invalidate.py --all                           # every pair of the current model version
+
+
+def invalidate(src_lang, tgt_lang, connect_timeout):
+    os.environ.setdefault("Enable_Cache", "true")
+    os.environ.setdefault("Cache_Debug", "false")
+    os.environ.setdefault("Timeout", "1000")
+    redis_cache = RedisCache(CacheOptions())
+    redis_cache.wait_until_ready(connect_timeout)
+    # cache keys are built from str(Language), see RedisCache.try_get_entry_from_cache
+    if src_lang is None:
+        return redis_cache.invalidate_cache()
+    return redis_cache.invalidate_cache(str(abbrev_to_lang[src_lang]), str(abbrev_to_lang[tgt_lang]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Invalidate cached reinflections of a language pair or of the whole model version.")
+    parser.add_argument("--src-lang", help="source language abbreviation, e.g. en")
+    parser.add_argument("--tgt-lang", help="target language abbreviation, e.g. es")
+    parser.add_argument("--all", action="store_true", help="invalidate every language pair of the current model version")
+    parser.add_argument("--connect-timeout", type=int, default=120, help="seconds to wait for the Redis connection")
+    args = parser.parse_args()
+
+    if args.all == bool(args.src_lang or args.tgt_lang):
+        parser.error("pass either --all or both --src-lang and --tgt-lang")
+    if not args.all:
+        if not (args.src_lang and args.tgt_lang):
+            parser.error("--src-lang and --tgt-lang are both required")
+        for code in (args.src_lang, args.tgt_lang):
+            if code not in abbrev_to_lang:
+                parser.error(f"unknown language abbreviation: {code}")
+
+    generation = invalidate(args.src_lang, args.tgt_lang, args.connect_timeout)
+    if generation is None:
+        raise SystemExit("Invalidation failed, no Redis connection")
+    logging.error("Cache generation is now %d", generation)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import hashlib
+import logging
+import threading
+import time
+KEY_DIGEST_SIZE = 16
+KEY_FIELD_SEPARATOR = "\x1f"
+
+
+def parse_generations(values):
+    return [int(value) if value is not None else 0 for value in values]
+
+
+class CacheKeyBuilder:
+    # Keys look like b"<component>:<model version>.<model generation>:<src>-<tgt>.<pair generation>:" followed by a
+    # 16 byte blake2b digest of the normalized sentence pair. Bumping a generation counter in Redis moves every
+    # reader to a new key space, so a model or a language pair is invalidated with a single INCR and the
+    # orphaned entries simply expire.
+    def __init__(self, component, model_version, refresh_interval, get_redis_connect, circuit_breaker=None):
+        self.component = component
+        self.model_version = model_version
+        self.refresh_interval = refresh_interval
+        self.get_redis_connect = get_redis_connect
+        self.circuit_breaker = circuit_breaker
+        self.generations = {}
+        self.prefixes = {}
+        self.lock = threading.Lock()
+        self.refresher = None
+
+    def get_generation_key_prefix(self):
+        return f"{self.component}:gen:"
+
+    def get_model_generation_key(self):
+        return f"{self.get_generation_key_prefix()}{self.model_version}"
+
+    def get_pair_generation_key(self, src_lang, tgt_lang):
+        return f"{self.get_model_generation_key()}:{src_lang}-{tgt_lang}"
+
+    def get_generation_keys(self, src_lang, tgt_lang):
+        return [self.get_model_generation_key(), self.get_pair_generation_key(src_lang, tgt_lang)]
+
+    def fetch_generations(self, generation_keys):
+        # is_open() rather than allow_request(): the single half-open probe belongs to a request, whose outcome is
+        # recorded on the breaker; taken here it would keep the circuit open on a replica without traffic
+        redis_connect = self.get_redis_connect()
+        if not redis_connect or (self.circuit_breaker is not None and self.circuit_breaker.is_open()):
+            return None
+        try:
+            return parse_generations(redis_connect.mget(generation_keys))
+        except Exception as e:
+            logging.error("Failed to read cache key generations: %s", str(e))
+            return None
+
+    def build_prefix(self, src_lang, tgt_lang):
+        model_generation = self.generations.get(self.get_model_generation_key(), 0)
+        pair_generation = self.generations.get(self.get_pair_generation_key(src_lang, tgt_lang), 0)
+        return f"{self.component}:{self.model_version}.{model_generation}:{src_lang}-{tgt_lang}.{pair_generation}:".encode("utf-8")
+
+    def get_memoized_prefix(self, src_lang, tgt_lang):
+        return self.prefixes.get((src_lang, tgt_lang))
+
+    def get_prefix(self, src_lang, tgt_lang):
+        prefix = self.get_memoized_prefix(src_lang, tgt_lang)
+        if prefix is not None:
+            return prefix
+        generation_keys = self.get_generation_keys(src_lang, tgt_lang)
+        return self.update_prefix(src_lang, tgt_lang, generation_keys, self.fetch_generations(generation_keys))
+
+    def update_prefix(self, src_lang, tgt_lang, generation_keys, generations):
+        # generations were read by the caller, so AsyncRedisCache can read them without blocking its event loop
+        with self.lock:
+            if generations is None:
+                # not memoized: a prefix built without the current generations (e.g. before Redis is connected)
+                # may address an invalidated key space, so the generations are read again on the next call
+                return self.build_prefix(src_lang, tgt_lang)
+            self.generations.update(zip(generation_keys, generations))
+            prefix = self.build_prefix(src_lang, tgt_lang)
+            self.prefixes[(src_lang, tgt_lang)] = prefix
+        self.start_refresher()
+        return prefix
+
+    def get_digest(self, source_fast_words, orig_tgt_fast_words):
+        combined_data = " ".join(source_fast_words) + KEY_FIELD_SEPARATOR + " ".join(orig_tgt_fast_words)
+        return hashlib.blake2b(combined_data.encode("utf-8"), digest_size=KEY_DIGEST_SIZE).digest()
+
+    def build_key(self, src_lang, tgt_lang, source_fast_words, orig_tgt_fast_words):
+        return self.get_prefix(src_lang, tgt_lang) + self.get_digest(source_fast_words, orig_tgt_fast_words)
+
+    def refresh(self):
+        with self.lock:
+            pairs = list(self.prefixes.keys())
+        generation_keys = [self.get_model_generation_key()] + [self.get_pair_generation_key(src_lang, tgt_lang) for src_lang, tgt_lang in pairs]
+        generations = self.fetch_generations(generation_keys)
+        if generations is None:
+            return
+        with self.lock:
+            self.generations.update(zip(generation_keys, generations))
+            for src_lang, tgt_lang in pairs:
+                self.prefixes[(src_lang, tgt_lang)] = self.build_prefix(src_lang, tgt_lang)
+
+    def refresh_forever(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error("Failed to refresh cache key generations: %s", str(e))
+
+    def start_refresher(self):
+        if self.refresher is not None:
+            return
+        with self.lock:
+            if self.refresher is None:
+                self.refresher = threading.Thread(target=self.refresh_forever, name="cache-key-generations", daemon=True)
+                self.refresher.start()
+
+    def invalidate(self, src_lang=None, tgt_lang=None):
+        # src_lang/tgt_lang None invalidates every language pair of the current model version
+        redis_connect = self.get_redis_connect()
+        if not redis_connect:
+            logging.error("Cache Invalidate: No Cache Redis Connection was established.")
+            return None
+        if src_lang is None or tgt_lang is None:
+            generation_key = self.get_model_generation_key()
+        else:
+            generation_key = self.get_pair_generation_key(src_lang, tgt_lang)
+            self.get_prefix(src_lang, tgt_lang)
+        generation = redis_connect.incr(generation_key)
+        logging.error("Cache generation %s bumped to %d", generation_key, generation)
+        self.refresh()
+        return generation
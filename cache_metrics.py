@@ -0,0 +1,155 @@
+from opencensus.stats import aggregation as aggregation_module
+from opencensus.stats import measure as measure_module
+from opencensus.stats import view as view_module
+from opencensus.tags import tag_map as tag_map_module
+
+##https://opencensus.io/stats/measure/
+cache_hits_measure = measure_module.MeasureInt("cache_hits",
+                                           "number of cache hits",
+                                           "hits")
+cache_misses_measure = measure_module.MeasureInt("cache_misses",
+                                           "number of cache misses",
+                                           "misses")
+cache_timeouts_measure = measure_module.MeasureInt("cache_timeouts",
+                                           "number of timed out cache calls",
+                                           "timeouts")
+cache_errors_measure = measure_module.MeasureInt("cache_errors",
+                                           "number of failed cache calls",
+                                           "errors")
+cache_pool_exhausted_measure = measure_module.MeasureInt("cache_pool_exhausted",
+                                           "number of cache calls that found no free Redis connection",
+                                           "calls")
+cache_dropped_writes_measure = measure_module.MeasureInt("cache_dropped_writes",
+                                           "number of cache writes dropped by the write-behind queue",
+                                           "writes")
+cache_write_behind_depth_measure = measure_module.MeasureInt("cache_write_behind_depth",
+                                           "writes waiting in the write-behind queue",
+                                           "writes")
+cache_get_latency_measure = measure_module.MeasureFloat("cache_get_latency",
+                                           "latency of cache GET calls",
+                                           "ms")
+cache_set_latency_measure = measure_module.MeasureFloat("cache_set_latency",
+                                           "latency of cache SET calls",
+                                           "ms")
+cache_value_size_measure = measure_module.MeasureInt("cache_value_size",
+                                           "size of cache values read and written",
+                                           "By")
+
+# sub-millisecond buckets for same-region Redis, millisecond buckets up to the configured Timeout
+latency_buckets_ms = [0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 7.5, 10, 15, 20, 30, 50, 75, 100, 200, 500, 1000]
+value_size_buckets = [64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 65536]
+
+cache_hits_view = view_module.View("cache hits view",
+                               "number of cache hits",
+                               ["srcLanguage","tgtLanguage","cacheTier"],
+                               cache_hits_measure,
+                               aggregation_module.CountAggregation())
+cache_misses_view = view_module.View("cache misses view",
+                               "number of cache misses",
+                               ["srcLanguage","tgtLanguage"],
+                               cache_misses_measure,
+                               aggregation_module.CountAggregation())
+cache_timeouts_view = view_module.View("cache timeouts view",
+                               "number of timed out cache calls",
+                               ["srcLanguage","tgtLanguage"],
+                               cache_timeouts_measure,
+                               aggregation_module.CountAggregation())
+cache_errors_view = view_module.View("cache errors view",
+                               "number of failed cache calls",
+                               ["srcLanguage","tgtLanguage"],
+                               cache_errors_measure,
+                               aggregation_module.CountAggregation())
+cache_pool_exhausted_view = view_module.View("cache pool exhausted view",
+                               "number of cache calls that found no free Redis connection",
+                               ["srcLanguage","tgtLanguage"],
+                               cache_pool_exhausted_measure,
+                               aggregation_module.CountAggregation())
+cache_dropped_writes_view = view_module.View("cache dropped writes view",
+                               "number of cache writes dropped by the write-behind queue",
+                               ["srcLanguage","tgtLanguage"],
+                               cache_dropped_writes_measure,
+                               aggregation_module.CountAggregation())
+cache_write_behind_depth_view = view_module.View("cache write-behind depth view",
+                               "writes waiting in the write-behind queue when a batch is taken",
+                               [],
+                               cache_write_behind_depth_measure,
+                               aggregation_module.LastValueAggregation())
+cache_get_latency_view = view_module.View("cache get latency view",
+                               "distribution of cache GET latency",
+                               ["srcLanguage","tgtLanguage"],
+                               cache_get_latency_measure,
+                               aggregation_module.DistributionAggregation(latency_buckets_ms))
+cache_set_latency_view = view_module.View("cache set latency view",
+                               "distribution of cache SET latency",
+                               ["srcLanguage","tgtLanguage"],
+                               cache_set_latency_measure,
+                               aggregation_module.DistributionAggregation(latency_buckets_ms))
+cache_value_size_view = view_module.View("cache value size view",
+                               "distribution of cache value sizes",
+                               ["srcLanguage","tgtLanguage"],
+                               cache_value_size_measure,
+                               aggregation_module.DistributionAggregation(value_size_buckets))
+
+cache_views = [cache_hits_view, cache_misses_view, cache_timeouts_view, cache_errors_view, cache_pool_exhausted_view,
+               cache_dropped_writes_view, cache_write_behind_depth_view, cache_get_latency_view, cache_set_latency_view, cache_value_size_view]
+
+
+class CacheMetrics:
+    # Records the cache measures from RedisCache. Tag maps are built once per (language pair, tier) and reused,
+    # so a recording costs one measurement map and a few dict lookups.
+    def __init__(self, stats_recorder):
+        self.stats_recorder = stats_recorder
+        self.tag_maps = {}
+
+    def get_tag_map(self, languages, tier=None):
+        tag_map = self.tag_maps.get((languages, tier))
+        if tag_map is None:
+            tag_map = tag_map_module.TagMap()
+            if languages is not None:
+                tag_map.insert("srcLanguage", languages[0])
+                tag_map.insert("tgtLanguage", languages[1])
+            if tier is not None:
+                tag_map.insert("cacheTier", tier)
+            self.tag_maps[(languages, tier)] = tag_map
+        return tag_map
+
+    def record_count(self, measure, languages, tier=None):
+        measurement_map = self.stats_recorder.new_measurement_map()
+        measurement_map.measure_int_put(measure, 1)
+        measurement_map.record(self.get_tag_map(languages, tier))
+
+    def record_get(self, languages, hit, tier, value_size):
+        measurement_map = self.stats_recorder.new_measurement_map()
+        measurement_map.measure_int_put(cache_hits_measure if hit else cache_misses_measure, 1)
+        if value_size:
+            measurement_map.measure_int_put(cache_value_size_measure, value_size)
+        measurement_map.record(self.get_tag_map(languages, tier))
+
+    def record_get_latency(self, languages, latency):
+        measurement_map = self.stats_recorder.new_measurement_map()
+        measurement_map.measure_float_put(cache_get_latency_measure, latency)
+        measurement_map.record(self.get_tag_map(languages))
+
+    def record_set(self, languages, latency, value_size):
+        measurement_map = self.stats_recorder.new_measurement_map()
+        if latency is not None:
+            measurement_map.measure_float_put(cache_set_latency_measure, latency)
+        measurement_map.measure_int_put(cache_value_size_measure, value_size)
+        measurement_map.record(self.get_tag_map(languages))
+
+    def record_timeout(self, languages):
+        self.record_count(cache_timeouts_measure, languages)
+
+    def record_error(self, languages):
+        self.record_count(cache_errors_measure, languages)
+
+    def record_pool_exhausted(self, languages):
+        self.record_count(cache_pool_exhausted_measure, languages)
+
+    def record_dropped_write(self, languages):
+        self.record_count(cache_dropped_writes_measure, languages)
+
+    def record_write_behind_depth(self, depth):
+        measurement_map = self.stats_recorder.new_measurement_map()
+        measurement_map.measure_int_put(cache_write_behind_depth_measure, depth)
+        measurement_map.record(self.get_tag_map(None))
@@ -0,0 +1,140 @@
+import json
+import logging
+import zlib
+from api_interfaces import ApiGender
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Layout of a v1 value:
+#   byte 0      VALUE_FORMAT_V1
+#   byte 1      compression (COMPRESSION_NONE / COMPRESSION_ZLIB / COMPRESSION_ZSTD)
+#   bytes 2..   body, compressed as a whole when byte 1 is not COMPRESSION_NONE
+# The body is a sequence of (gender code: 1 byte, length: varint, UTF-8 text) entries. Gender code
+# EXPLICIT_GENDER_CODE is followed by a (length, UTF-8 key) pair for keys without a code.
+# Values of older deployments (the Python repr of the tgt dict) live under the pre-namespace keys, which
+# CacheKeyBuilder never produces, so they are not read.
+VALUE_FORMAT_V1 = 1
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+EXPLICIT_GENDER_CODE = 255
+
+GENDER_KEYS = [str(ApiGender.Neutral), str(ApiGender.Feminine), str(ApiGender.Masculine)]
+GENDER_CODES = {gender_key: code for code, gender_key in enumerate(GENDER_KEYS)}
+GENDER_JSON_KEYS = [json.dumps(gender_key) for gender_key in GENDER_KEYS]
+
+
+def encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+class CacheValueCodec:
+    def __init__(self, compression, compression_threshold):
+        self.compression_threshold = compression_threshold
+        self.compression = COMPRESSION_NONE
+        # values written by replicas that compress with zstd are readable whatever this replica writes
+        self.zstd_decompressor = zstandard.ZstdDecompressor() if zstandard is not None else None
+        if compression == "zstd" and zstandard is not None:
+            self.compression = COMPRESSION_ZSTD
+            self.zstd_compressor = zstandard.ZstdCompressor()
+        elif compression in ("zstd", "zlib"):
+            if compression == "zstd":
+                logging.error("zstandard is not installed, falling back to zlib cache value compression")
+            self.compression = COMPRESSION_ZLIB
+
+    def encode(self, tgt_dict):
+        body = bytearray()
+        for gender_key, text in tgt_dict.items():
+            code = GENDER_CODES.get(gender_key)
+            if code is None:
+                body.append(EXPLICIT_GENDER_CODE)
+                key_bytes = gender_key.encode("utf-8")
+                encode_varint(len(key_bytes), body)
+                body += key_bytes
+            else:
+                body.append(code)
+            text_bytes = text.encode("utf-8")
+            encode_varint(len(text_bytes), body)
+            body += text_bytes
+        compression = COMPRESSION_NONE
+        if self.compression != COMPRESSION_NONE and len(body) >= self.compression_threshold:
+            compression = self.compression
+            if compression == COMPRESSION_ZSTD:
+                body = self.zstd_compressor.compress(bytes(body))
+            else:
+                body = zlib.compress(bytes(body))
+        return bytes((VALUE_FORMAT_V1, compression)) + bytes(body)
+
+    def decode_v1(self, value):
+        compression = value[1]
+        body = memoryview(value)[2:]
+        if compression == COMPRESSION_ZLIB:
+            body = zlib.decompress(body)
+        elif compression == COMPRESSION_ZSTD:
+            if self.zstd_decompressor is None:
+                return None
+            body = self.zstd_decompressor.decompress(body)
+        elif compression != COMPRESSION_NONE:
+            return None
+        entries = []
+        pos = 0
+        end = len(body)
+        while pos < end:
+            code = body[pos]
+            pos += 1
+            if code == EXPLICIT_GENDER_CODE:
+                length, pos = decode_varint(body, pos)
+                if pos + length > end:
+                    return None
+                json_key = json.dumps(bytes(body[pos:pos + length]).decode("utf-8"))
+                pos += length
+            else:
+                json_key = GENDER_JSON_KEYS[code]
+            length, pos = decode_varint(body, pos)
+            # a truncated value would otherwise decode to a shortened text
+            if pos + length > end:
+                return None
+            entries.append((json_key, bytes(body[pos:pos + length]).decode("utf-8")))
+            pos += length
+        return entries
+
+    def decode(self, value):
+        # returns [(json encoded gender key, text)] or None when the value cannot be read
+        try:
+            if value[0] == VALUE_FORMAT_V1:
+                return self.decode_v1(value)
+        except Exception as e:
+            logging.error("Failed to decode cache value: %s", str(e))
+        return None
+
+    def decode_tgt_dict(self, value):
+        entries = self.decode(value)
+        if entries is None:
+            return None
+        return {json.loads(json_key): text for json_key, text in entries}
+
+    def build_response(self, src_text, value):
+        # Assembles the same document as json.dumps({"src_sentence": src_text, "tgt": tgt_dict}) from the
+        # decoded entries, without materializing and re-serializing the dict.
+        entries = self.decode(value)
+        if entries is None:
+            return None
+        tgt = ", ".join([json_key + ": " + json.dumps(text) for json_key, text in entries])
+        return '{"src_sentence": ' + json.dumps(src_text) + ', "tgt": {' + tgt + '}}'
@@ -0,0 +1,155 @@
+import argparse
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+import nltk
+import aml_scorer
+from logger import get_disabled_logger
+from model_initializer import load_all_models_from_json
+from redis_cache import CacheOptions, RedisCache
+
+# Precomputes reinflections for a corpus and bulk-loads them into the cache, e.g. before shifting traffic to a
+# new deployment. The corpus is JSON lines with src_lang, tgt_lang, src and tgt fields, or a TSV file with the
+# same four columns. Records go through the same validation as scoring requests and are reinflected with the
+# API's default options, so a warmed entry holds what online scoring would store under its key. Redis settings
+# come from the same environment variables as the scoring deployment.
+#
+#   python cache_warmup.py --input test_sets/en-es.jsonl --workers 8 --checkpoint warmup.ckpt
+
+
+def read_corpus(path, trace_id):
+    with open(path, encoding="utf-8") as corpus:
+        for line in corpus:
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                fields = (record["src_lang"], record["tgt_lang"], record["src"], record["tgt"])
+            else:
+                fields = line.split("\t")
+                if len(fields) != 4:
+                    logging.error("Skipping malformed corpus line: %s", line[:100])
+                    continue
+            src_lang, tgt_lang, src_text, tgt_text = fields
+            data = json.dumps({"source": {"language": src_lang, "text": src_text},
+                               "target": {"language": tgt_lang, "text": tgt_text}})
+            aml_request, error_response = aml_scorer.validate_request(data, aml_scorer.logger, trace_id)
+            # yielded even when invalid, so that the checkpoint keeps counting corpus lines
+            yield aml_request if error_response is None else None
+
+
+def read_checkpoint(path, input_path):
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path, encoding="utf-8") as checkpoint_file:
+        checkpoint = json.load(checkpoint_file)
+    if checkpoint.get("input") != os.path.abspath(input_path):
+        logging.error("Checkpoint %s belongs to %s, starting from the beginning", path, checkpoint.get("input"))
+        return 0
+    return checkpoint["records_done"]
+
+
+def write_checkpoint(path, input_path, records_done):
+    if not path:
+        return
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as checkpoint_file:
+        json.dump({"input": os.path.abspath(input_path), "records_done": records_done}, checkpoint_file)
+    os.replace(tmp_path, path)
+
+
+def init_logger():
+    aml_scorer.logger = get_disabled_logger().get_logger(component_name=aml_scorer.component_name)
+
+
+def init_worker(config_path, nltk_data_path):
+    nltk.data.path.append(nltk_data_path)
+    init_logger()
+    aml_scorer.Debias_Models = load_all_models_from_json(config_path, app_logger=get_disabled_logger(), parent_tracer=None)
+
+
+def compute_tgt_dict(aml_request):
+    # the function online scoring runs, so max_words/max_hypotheses come from the request options like there
+    tgt_dict, has_reinflection, debug_options = aml_scorer.compute_reinflection(aml_request, "warmup")
+    return tgt_dict
+
+
+def chunked(records, size):
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def warm_up(args):
+    model_path = os.path.join(os.getenv("AZUREML_MODEL_DIR"), "modelfiles")
+    config_path = args.config or os.path.join(model_path, "default_config.json")
+    nltk_data_path = os.path.join(model_path, "ivl", "nltk_data")
+
+    os.environ.setdefault("Enable_Cache", "true")
+    os.environ.setdefault("Cache_Debug", "false")
+    os.environ.setdefault("Timeout", "1000")
+    cache_options = CacheOptions()
+    redis_cache = RedisCache(cache_options)
+    redis_cache.wait_until_ready(args.connect_timeout)
+    init_logger()
+
+    trace_id = f"warmup-{uuid.uuid4()}"
+    records_done = read_checkpoint(args.checkpoint, args.input)
+    if records_done:
+        logging.error("Resuming after %d records", records_done)
+    records = read_corpus(args.input, trace_id)
+    for _ in range(records_done):
+        next(records, None)
+
+    start_time = time.monotonic()
+    written = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker, initargs=(config_path, nltk_data_path)) as pool:
+        for chunk in chunked(records, args.batch_size):
+            valid = [record for record in chunk if record is not None]
+            if len(valid) < len(chunk):
+                logging.error("Skipping %d records that failed validation", len(chunk) - len(valid))
+            entries = redis_cache.try_get_entries_from_cache(valid, redis_cache.redis_connect, trace_id, "true")
+            misses = [(record, entry[2]) for record, entry in zip(valid, entries) if entry[0] is None and entry[2] is not None]
+            if misses:
+                tgt_dicts = pool.map(compute_tgt_dict, [record for record, cache_key in misses])
+                items = [(cache_key, redis_cache.value_codec.encode(tgt_dict)) for (record, cache_key), tgt_dict in zip(misses, tgt_dicts)]
+                if redis_cache.set_data_in_cache_batch(redis_cache.redis_connect, items, trace_id, cache_options.expiration_time) is None:
+                    raise RuntimeError(f"Failed to write batch after {records_done} records, rerun to resume from the checkpoint")
+                written += len(items)
+            records_done += len(chunk)
+            write_checkpoint(args.checkpoint, args.input, records_done)
+
+            if args.max_writes_per_second:
+                ahead = written / args.max_writes_per_second - (time.monotonic() - start_time)
+                if ahead > 0:
+                    time.sleep(ahead)
+            logging.error("Warm-up progress: %d records, %d entries written", records_done, written)
+    return records_done, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute reinflections for a corpus and load them into the Redis cache.")
+    parser.add_argument("--input", required=True, help="corpus of src_lang, tgt_lang, src, tgt records (JSON lines or TSV)")
+    parser.add_argument("--config", help="model config, defaults to $AZUREML_MODEL_DIR/modelfiles/default_config.json")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="reinflection worker processes")
+    parser.add_argument("--batch-size", type=int, default=256, help="records per MGET lookup and pipelined write")
+    parser.add_argument("--max-writes-per-second", type=float, default=0, help="throttle for cache writes, 0 disables it")
+    parser.add_argument("--checkpoint", help="file recording progress; an existing checkpoint for the same input is resumed")
+    parser.add_argument("--connect-timeout", type=int, default=120, help="seconds to wait for the Redis connection")
+    args = parser.parse_args()
+
+    records_done, written = warm_up(args)
+    logging.error("Warm-up complete: %d records, %d entries written", records_done, written)
+
+
+if __name__ == "__main__":
+    main()
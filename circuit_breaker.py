@@ -0,0 +1,45 @@
+import logging
+import threading
+import time
+class CircuitBreaker:
+    # Opens after failure_threshold consecutive failures and rejects calls for cooldown seconds.
+    # Once the cooldown has passed a single probe call is let through; its outcome closes or re-opens the circuit.
+    def __init__(self, failure_threshold, cooldown, name="redis"):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.name = name
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow_request(self):
+        if self.opened_at is None:
+            return True
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            now = time.monotonic()
+            if now - self.opened_at >= self.cooldown:
+                self.opened_at = now
+                return True
+            return False
+
+    def record_success(self):
+        if self.failures or self.opened_at is not None:
+            with self.lock:
+                if self.opened_at is not None:
+                    logging.error("Circuit breaker %s closed", self.name)
+                self.failures = 0
+                self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logging.error("Circuit breaker %s opened after %d failures, skipping cache for %s seconds",
+                                  self.name, self.failures, self.cooldown)
+                self.opened_at = time.monotonic()
@@ -0,0 +1,77 @@
+import logging
+import multiprocessing
+import threading
+class InferencePoolUnavailable(Exception):
+    pass
+
+class InferencePoolFull(InferencePoolUnavailable):
+    pass
+
+class InferencePoolTimeout(InferencePoolUnavailable):
+    pass
+
+class InferenceSlot:
+    # A pending-task slot, released exactly once: by the pool's result callback when the task completes, or by
+    # the waiting caller when it gives up, since the pool never completes a task whose worker died.
+    def __init__(self, slots):
+        self.slots = slots
+        self.released = False
+        self.lock = threading.Lock()
+
+    def release(self, result=None):
+        with self.lock:
+            if self.released:
+                return
+            self.released = True
+        self.slots.release()
+
+class InferencePool:
+    # Worker processes are forked once, right after the models are loaded, so they share the parent's model
+    # memory copy-on-write. At most max_pending tasks are queued or running; a caller that cannot get a slot
+    # within submit_timeout seconds gets InferencePoolFull instead of queueing without bound, and one whose
+    # task has not completed within task_timeout seconds gets InferencePoolTimeout.
+    def __init__(self, num_workers, max_pending, submit_timeout, task_timeout):
+        self.num_workers = num_workers
+        self.submit_timeout = submit_timeout
+        self.task_timeout = task_timeout
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.rejected = 0
+        self.timed_out = 0
+        self.pool = multiprocessing.get_context("fork").Pool(processes=num_workers)
+        logging.error("Inference pool started with %d worker processes", num_workers)
+
+    def submit(self, fn, args):
+        # returns (AsyncResult, InferenceSlot) for wait()
+        if not self.slots.acquire(timeout=self.submit_timeout):
+            with self.lock:
+                self.rejected += 1
+            raise InferencePoolFull(f"no inference slot available within {self.submit_timeout} seconds")
+        slot = InferenceSlot(self.slots)
+        try:
+            return self.pool.apply_async(fn, args, callback=slot.release, error_callback=slot.release), slot
+        except Exception:
+            slot.release()
+            raise
+
+    def wait(self, pending):
+        result, slot = pending
+        try:
+            return result.get(self.task_timeout)
+        except multiprocessing.TimeoutError:
+            slot.release()
+            with self.lock:
+                self.timed_out += 1
+            raise InferencePoolTimeout(f"inference task did not complete within {self.task_timeout} seconds")
+
+    def run(self, fn, args):
+        return self.wait(self.submit(fn, args))
+
+    def map(self, fn, args_list):
+        pending = [self.submit(fn, args) for args in args_list]
+        return [self.wait(task) for task in pending]
+
+    def close(self):
+        # terminate rather than close: a task lost with a dead worker would keep Pool.join() waiting forever
+        self.pool.terminate()
+        self.pool.join()
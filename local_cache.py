@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import OrderedDict
+class LocalCache:
+    # Bounded in-process LRU with a per-entry TTL, sized both by entry count and by bytes.
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_entry_size(self, key, value):
+        return len(key) + len(value)
+
+    def remove_entry(self, key):
+        value, size, expires_at = self.entries.pop(key)
+        self.total_bytes -= size
+
+    def get(self, key):
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at <= now:
+                self.remove_entry(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        size = self.get_entry_size(key, value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self.lock:
+            if key in self.entries:
+                self.remove_entry(key)
+            self.entries[key] = (value, size, expires_at)
+            self.total_bytes += size
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                oldest_key = next(iter(self.entries))
+                self.remove_entry(oldest_key)
+                self.evictions += 1
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
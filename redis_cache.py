@@ -2,136 +2,633 @@ import redis
 import os
 from azure.identity import DefaultAzureCredential
 import time
-import hashlib
 import logging
-import json
-from func_timeout import func_timeout
+import threading
+import uuid
+from redis.backoff import NoBackoff
+from redis.retry import Retry
 from normalization import get_normalized_sentence
+from local_cache import LocalCache
+from circuit_breaker import CircuitBreaker
+from write_behind import WriteBehindQueue
+from cache_value_codec import CacheValueCodec
+from cache_keys import CacheKeyBuilder
+from single_flight import SingleFlight
+from admission import AdmissionPolicy, CountMinSketch
+from redis_shards import CacheRedisCluster, RedisShard, ShardedRedis, disconnect_client, is_pool_exhausted, parse_endpoints, parse_replica_groups
+LEASE_KEY_SUFFIX = b":lease"
+RELEASE_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
 class CacheOptions:
     def __init__(self):
         self.cache_flag = os.getenv("Enable_Cache").lower()
         self.cache_log_flag = os.getenv("Cache_Debug").lower()
         self.timeout = int(os.getenv("Timeout")) * 0.001
         self.expiration_time = os.getenv("Cache_expiration_time")
+        self.l1_cache_flag = os.getenv("Enable_L1_Cache", "false").lower()
+        self.l1_max_entries = int(os.getenv("L1_Cache_Max_Entries", "10000"))
+        self.l1_max_bytes = int(os.getenv("L1_Cache_Max_Bytes", str(64 * 1024 * 1024)))
+        self.l1_ttl = int(os.getenv("L1_Cache_TTL", "300"))
+        self.max_connections = int(os.getenv("Redis_Max_Connections", "50"))
+        self.circuit_breaker_threshold = int(os.getenv("Circuit_Breaker_Threshold", "5"))
+        self.circuit_breaker_cooldown = int(os.getenv("Circuit_Breaker_Cooldown", "30"))
+        self.write_behind_flag = os.getenv("Cache_Write_Behind", "false").lower()
+        self.write_behind_queue_size = int(os.getenv("Write_Behind_Queue_Size", "10000"))
+        self.write_behind_batch_size = int(os.getenv("Write_Behind_Batch_Size", "100"))
+        self.write_behind_flush_interval = int(os.getenv("Write_Behind_Flush_Interval", "50")) * 0.001
+        self.compression = os.getenv("Cache_Compression", "zlib").lower()
+        self.compression_threshold = int(os.getenv("Cache_Compression_Threshold", "512"))
+        self.key_component = os.getenv("Cache_Key_Component", "gdb")
+        self.model_version = os.getenv("Cache_Model_Version") or os.path.basename(os.path.normpath(os.getenv("AZUREML_MODEL_DIR", "0")))
+        self.generation_refresh_interval = int(os.getenv("Cache_Generation_Refresh_Interval", "30"))
+        self.lease_flag = os.getenv("Cache_Stampede_Lease", "false").lower()
+        self.lease_time = int(os.getenv("Cache_Lease_Time", "2000"))
+        self.lease_wait = int(os.getenv("Cache_Lease_Wait", "1000")) * 0.001
+        self.lease_poll_interval = int(os.getenv("Cache_Lease_Poll_Interval", "50")) * 0.001
+        self.token_refresh_margin = int(os.getenv("Token_Refresh_Margin", "600"))
+        self.reconnect_interval = int(os.getenv("Redis_Reconnect_Interval", "60"))
+        self.connection_drain_time = int(os.getenv("Redis_Connection_Drain_Time", "30"))
+        self.admission_threshold = int(os.getenv("Cache_Admission_Threshold", "1"))
+        self.adaptive_ttl_flag = os.getenv("Cache_Adaptive_TTL", "false").lower()
+        self.hot_threshold = int(os.getenv("Cache_Hot_Threshold", "4"))
+        self.min_ttl = os.getenv("Cache_Min_TTL", self.expiration_time)
+        self.max_ttl = os.getenv("Cache_Max_TTL", self.expiration_time)
+        self.sketch_width = int(os.getenv("Cache_Sketch_Width", "65536"))
+        self.sketch_depth = int(os.getenv("Cache_Sketch_Depth", "4"))
+        self.segment_flag = os.getenv("Cache_Segment_Mode", "false").lower()
+        # Redis_Cache is "host[:port]" or a comma separated list of shards; Redis_Cache_Replicas lists the read
+        # replicas of every shard, ";" between shards and "," between the replicas of one shard
+        self.redis_endpoints = parse_endpoints(os.getenv("Redis_Cache"))
+        self.redis_replicas = parse_replica_groups(os.getenv("Redis_Cache_Replicas"))
+        self.read_from_replicas = os.getenv("Redis_Read_From_Replicas", "false").lower()
+        self.cluster_mode = os.getenv("Redis_Cluster_Mode", "false").lower()
 class RedisCache:
     def __init__(self, cache_options):
         self.cache_options = cache_options
-        self.redis_connect = self.get_redis_connection()
+        self.local_cache = None
+        if cache_options.l1_cache_flag == "true":
+            self.local_cache = LocalCache(cache_options.l1_max_entries, cache_options.l1_max_bytes, cache_options.l1_ttl)
+        self.value_codec = CacheValueCodec(cache_options.compression, cache_options.compression_threshold)
+        self.circuit_breaker = CircuitBreaker(cache_options.circuit_breaker_threshold, cache_options.circuit_breaker_cooldown)
+        self.shard_breakers = {}
+        self.credential = None
+        self.redis_connect = None
+        self.write_behind = self.create_write_behind()
+        self.key_builder = self.create_key_builder()
+        self.single_flight = SingleFlight()
+        self.metrics = None
+        self.admission_policy = self.create_admission_policy()
+        # the cache stays disabled (every lookup misses) until the first connection is ready
+        self.connection_thread = threading.Thread(target=self.maintain_connection, name="redis-connection", daemon=True)
+        self.connection_thread.start()
+
+    def create_key_builder(self):
+        return CacheKeyBuilder(self.cache_options.key_component, self.cache_options.model_version,
+                               self.cache_options.generation_refresh_interval,
+                               lambda: self.redis_connect, self.circuit_breaker)
+
+    def create_admission_policy(self):
+        if self.cache_options.admission_threshold <= 1 and self.cache_options.adaptive_ttl_flag != "true":
+            return None
+        sketch = CountMinSketch(self.cache_options.sketch_width, self.cache_options.sketch_depth, 10 * self.cache_options.sketch_width)
+        return AdmissionPolicy(sketch, self.cache_options.admission_threshold, self.cache_options.adaptive_ttl_flag == "true",
+                               self.cache_options.hot_threshold, self.cache_options.min_ttl, self.cache_options.max_ttl,
+                               self.cache_options.expiration_time)
+
+    def get_expiration_time(self, cache_key):
+        # returns (admit, expiration time) for a new entry
+        if self.admission_policy is None:
+            return True, os.getenv("Cache_expiration_time")
+        return self.admission_policy.get_expiration_time(cache_key)
+
+    def may_admit(self, cache_key):
+        if self.admission_policy is None:
+            return True
+        return self.admission_policy.may_admit(cache_key)
+
+    def get_extended_expiration_time(self, cache_key):
+        if self.admission_policy is None:
+            return None
+        return self.admission_policy.get_extended_expiration_time(cache_key)
+
+    def create_write_behind(self):
+        if self.cache_options.write_behind_flag != "true":
+            return None
+        return WriteBehindQueue(self, self.cache_options.write_behind_queue_size,
+                                self.cache_options.write_behind_batch_size,
+                                self.cache_options.write_behind_flush_interval)
+
+    def get_credential(self):
+        if self.credential is None:
+            self.credential = DefaultAzureCredential()
+        return self.credential
+
     def get_redis_connection(self):
         retry_times = 3
         retry_wait_time = 10 #in second
         for retry_count in range(retry_times):
             try:
-                creds = DefaultAzureCredential()
                 scope = os.getenv("Credential_Scope")
-                token = creds.get_token(scope)
+                token = self.get_credential().get_token(scope)
                 user_name = os.getenv("Redis_user_name")
-                redis_host = os.getenv("Redis_Cache")
-                redis_port = 6380
-                r = redis.Redis(
-                    host=redis_host,
-                    port=redis_port,
-                    ssl=True,
-                    username=user_name,
-                    password=token.token,
-                    decode_responses=True
-                )
+                r = self.create_redis_connection(user_name, token.token)
                 logging.error('########## Redis Cache Host Connection Intialized ##########')
-                return r
+                return r, token.expires_on
             except Exception as e:
-                logging.error("Failed to connect to Redis cache:", str(e))
+                logging.error("Failed to connect to Redis cache: %s", str(e))
                 if retry_count < retry_times - 1:
                     logging.error(f"Retrying after {retry_wait_time} seconds...")
                     time.sleep(retry_wait_time)
                 else:
                     break
-        return None
+        return None, None
+
+    def maintain_connection(self):
+        # Connects in the background, then re-authenticates with a fresh Entra token token_refresh_margin
+        # seconds before the current one expires and swaps in the new connection pool.
+        while True:
+            redis_connect, expires_on = self.get_redis_connection()
+            if redis_connect is not None:
+                self.swap_connection(redis_connect)
+                wait_time = max(expires_on - time.time() - self.cache_options.token_refresh_margin, self.cache_options.reconnect_interval)
+            else:
+                wait_time = self.cache_options.reconnect_interval
+            time.sleep(wait_time)
+
+    def swap_connection(self, redis_connect):
+        # Requests that already picked up the old client finish on it; its idle connections are closed once
+        # they had connection_drain_time seconds to complete.
+        old_redis_connect = self.redis_connect
+        self.redis_connect = redis_connect
+        if old_redis_connect is not None:
+            drain_timer = threading.Timer(self.cache_options.connection_drain_time, self.close_connection, [old_redis_connect])
+            drain_timer.daemon = True
+            drain_timer.start()
+
+    def close_connection(self, redis_connect):
+        try:
+            disconnect_client(redis_connect)
+        except Exception as e:
+            logging.error("Failed to close replaced Redis connection pool: %s", str(e))
+
+    def is_ready(self):
+        return self.redis_connect is not None
+
+    def wait_until_ready(self, timeout):
+        # for the offline tools, which need the connection before they can do anything
+        deadline = time.monotonic() + timeout
+        while not self.is_ready():
+            if time.monotonic() > deadline:
+                raise RuntimeError("Redis cache connection was not established")
+            time.sleep(1)
+
+    def get_connection_kwargs(self, redis_host, redis_port, user_name, password):
+        # Timeouts are enforced on the sockets and retries are disabled, so a slow Redis costs at most
+        # one Timeout per call and the connection is returned to the pool in a known state.
+        return dict(
+            host=redis_host,
+            port=redis_port,
+            username=user_name,
+            password=password,
+            socket_connect_timeout=self.cache_options.timeout,
+            socket_timeout=self.cache_options.timeout,
+            max_connections=self.cache_options.max_connections,
+            timeout=self.cache_options.timeout,
+            decode_responses=False
+        )
+
+    def create_redis_client(self, redis_host, redis_port, user_name, password):
+        pool = redis.BlockingConnectionPool(
+            connection_class=redis.SSLConnection,
+            retry=Retry(NoBackoff(), 0),
+            **self.get_connection_kwargs(redis_host, redis_port, user_name, password)
+        )
+        return redis.Redis(connection_pool=pool)
+
+    def get_cluster_kwargs(self, redis_host, redis_port, user_name, password):
+        # The cluster client keeps one pool per node and discovers the nodes from the given endpoint. Like the
+        # single node client it does not retry, so a call costs at most one Timeout.
+        return dict(
+            host=redis_host,
+            port=redis_port,
+            username=user_name,
+            password=password,
+            ssl=True,
+            socket_connect_timeout=self.cache_options.timeout,
+            socket_timeout=self.cache_options.timeout,
+            max_connections=self.cache_options.max_connections,
+            read_from_replicas=self.cache_options.read_from_replicas == "true",
+            cluster_error_retry_attempts=0,
+            decode_responses=False
+        )
+
+    def create_cluster_client(self, redis_host, redis_port, user_name, password):
+        return CacheRedisCluster(retry=Retry(NoBackoff(), 0), **self.get_cluster_kwargs(redis_host, redis_port, user_name, password))
+
+    def get_shard_breaker(self, name):
+        # per node breakers are kept across connection swaps, so a node known to be failing is not probed again
+        # as soon as the clients are recreated
+        circuit_breaker = self.shard_breakers.get(name)
+        if circuit_breaker is None:
+            circuit_breaker = self.shard_breakers.setdefault(name, CircuitBreaker(self.cache_options.circuit_breaker_threshold,
+                                                                                  self.cache_options.circuit_breaker_cooldown, name))
+        return circuit_breaker
+
+    def create_sharded_client(self, shards):
+        return ShardedRedis(shards, self.cache_options.read_from_replicas == "true",
+                            self.key_builder.get_generation_key_prefix().encode("utf-8"))
+
+    def is_sharded(self):
+        # a single endpoint without replicas keeps the plain client; otherwise every node gets its own pool
+        if self.cache_options.cluster_mode == "true":
+            return False
+        return len(self.cache_options.redis_endpoints) != 1 or bool(self.cache_options.redis_replicas)
+
+    def create_redis_connection(self, user_name, password):
+        endpoints = self.cache_options.redis_endpoints
+        if self.cache_options.cluster_mode == "true":
+            return self.create_cluster_client(*endpoints[0], user_name, password)
+        replica_groups = self.cache_options.redis_replicas
+        if not self.is_sharded():
+            return self.create_redis_client(*endpoints[0], user_name, password)
+        shards = []
+        for index, (redis_host, redis_port) in enumerate(endpoints):
+            replica_endpoints = replica_groups[index] if index < len(replica_groups) else []
+            shards.append(RedisShard(f"{redis_host}:{redis_port}",
+                                     self.create_redis_client(redis_host, redis_port, user_name, password),
+                                     [self.create_redis_client(host, port, user_name, password) for host, port in replica_endpoints],
+                                     self.get_shard_breaker))
+        return self.create_sharded_client(shards)
 
     def GenerateCacheKey(self, src_lang, tgt_lang, source_fast_words, orig_tgt_fast_words):
-        combined_data = src_lang + tgt_lang + " ".join(source_fast_words) + " ".join(orig_tgt_fast_words)
-        print('combined_data:',combined_data)
-        combined_data_bytes = combined_data.encode('utf-8')
-        print('combined_data_bytes:',combined_data_bytes)
-        hash_data = hashlib.sha256(combined_data_bytes).hexdigest()
-        return hash_data
+        return self.key_builder.build_key(src_lang, tgt_lang, source_fast_words, orig_tgt_fast_words)
+
+    def invalidate_cache(self, src_lang=None, tgt_lang=None):
+        return self.key_builder.invalidate(src_lang, tgt_lang)
 
     def normalized_sentence(self, src_text, tgt_text):
         source_fast_words, orig_tgt_fast_words,space_norm_source, space_norm_orig_tgt = get_normalized_sentence(src_text, tgt_text)
         return source_fast_words, orig_tgt_fast_words, space_norm_source, space_norm_orig_tgt
 
-    def get_data_from_cache(self, r, key, trace_id):
+    def get_data_from_cache(self, r, key, trace_id, languages=None):
+        if not self.circuit_breaker.allow_request():
+            return None, None
         try:
-            def get_data():
-                start_time = time.time()
-                value = r.get(key)
-                latency = round((time.time() - start_time) * 1000, 2)
+            start_time = time.time()
+            value = r.get(key)
+            latency = round((time.time() - start_time) * 1000, 2)
+            self.circuit_breaker.record_success()
+            if self.metrics is not None:
+                self.metrics.record_get_latency(languages, latency)
+            if value is not None:
                 return value, latency
-            try:
-                print("getenvTimeout:", int(os.getenv("Timeout")))
-                value, latency = func_timeout(int(os.getenv("Timeout")) * 0.001, get_data) 
-                print("value:",value)
-                print('key:',key)
-                if value is not None:
-                    return value, latency
-                else:
-                    return None, None
-            except Exception as e:
-                logging.error("get data in cache call timed out: %s (trace id: %s)", str(e),str(trace_id))
-                return None, None
+            else:
+                return None, latency
         except Exception as e:
-            logging.error("Failed to get data in cache: %s, trace id is: %s", str(e), str(trace_id))
+            self.record_call_error(e, languages, "get data in cache", trace_id)
             return None, None
 
-    def set_data_in_cache(self, r, key, value, trace_id, expiration_time=None):
+    def set_data_in_cache(self, r, key, value, trace_id, expiration_time=None, languages=None):
+        if not self.circuit_breaker.allow_request():
+            return None
         try:
-            def set_data():
-                start_time = time.time()
-                if expiration_time is not None:
-                    r.setex(key, expiration_time, value)
-                else:
-                    r.set(key, value)
-                latency = round((time.time() - start_time) * 1000, 2)
-                return latency
-            try:
-                latency = func_timeout(int(os.getenv("Timeout")) * 0.001, set_data) 
-                return latency
-            except Exception as e:
-                logging.error("set data in cache call timed out: %s (trace id: %s)", str(e),str(trace_id))
-                return None
+            start_time = time.time()
+            if expiration_time is not None:
+                r.setex(key, expiration_time, value)
+            else:
+                r.set(key, value)
+            latency = round((time.time() - start_time) * 1000, 2)
+            self.circuit_breaker.record_success()
+            return latency
+        except Exception as e:
+            self.record_call_error(e, languages, "set data in cache", trace_id)
+            return None
+
+    def get_data_from_cache_batch(self, r, keys, trace_id, languages=None):
+        if not self.circuit_breaker.allow_request():
+            return [None] * len(keys), None
+        try:
+            start_time = time.time()
+            values = r.mget(keys)
+            latency = round((time.time() - start_time) * 1000, 2)
+            self.circuit_breaker.record_success()
+            if self.metrics is not None:
+                self.metrics.record_get_latency(languages, latency)
+            return values, latency
+        except Exception as e:
+            self.record_call_error(e, languages, "batch get data in cache", trace_id)
+            return [None] * len(keys), None
+
+    def build_pipeline(self, r, items, expiration_time):
+        pipe = r.pipeline(transaction=False)
+        # items are (key, value) or (key, value, expiration time); a None value only refreshes the expiry
+        for item in items:
+            key, value = item[0], item[1]
+            item_expiration_time = item[2] if len(item) > 2 else expiration_time
+            if value is None:
+                pipe.expire(key, item_expiration_time)
+            elif item_expiration_time is not None:
+                pipe.setex(key, item_expiration_time, value)
+            else:
+                pipe.set(key, value)
+        return pipe
+
+    def set_data_in_cache_batch(self, r, items, trace_id, expiration_time=None, languages=None):
+        if not self.circuit_breaker.allow_request():
+            return None
+        try:
+            start_time = time.time()
+            self.build_pipeline(r, items, expiration_time).execute()
+            latency = round((time.time() - start_time) * 1000, 2)
+            self.circuit_breaker.record_success()
+            return latency
         except Exception as e:
-            logging.error("Failed to set data in cache: %s, trace id is: %s", str(e), str(trace_id))
+            self.record_call_error(e, languages, "batch set data in cache", trace_id)
             return None
 
+    def build_cached_response(self, src_text, cached_response):
+        return self.value_codec.build_response(src_text, cached_response)
+
+    def get_data_from_local_cache(self, key):
+        if self.local_cache is None:
+            return None, None
+        start_time = time.time()
+        value = self.local_cache.get(key)
+        if value is None:
+            return None, None
+        return value, round((time.time() - start_time) * 1000, 2)
+
+    def set_data_in_local_cache(self, key, value):
+        if self.local_cache is not None:
+            self.local_cache.set(key, value)
+
+    def acquire_lease(self, r, cache_key):
+        token = uuid.uuid4().hex
+        if r.set(cache_key + LEASE_KEY_SUFFIX, token, nx=True, px=self.cache_options.lease_time):
+            return token
+        return None
+
+    def release_lease(self, r, cache_key, token, trace_id):
+        try:
+            r.eval(RELEASE_LEASE_SCRIPT, 1, cache_key + LEASE_KEY_SUFFIX, token)
+        except Exception as e:
+            logging.error("Failed to release cache lease: %s, trace id is: %s", str(e), str(trace_id))
+
+    def wait_for_lease_holder(self, r, cache_key, trace_id):
+        # Returns (value, None) when another replica produced the entry while we waited, or (None, lease token)
+        # when this request should compute it; the token is None if leases are disabled or Redis is unavailable.
+        # A key the admission policy would not write yet gets no lease: nobody would produce the entry to wait for.
+        if self.cache_options.lease_flag != "true" or not r or not self.may_admit(cache_key):
+            return None, None
+        if not self.circuit_breaker.allow_request():
+            return None, None
+        try:
+            token = self.acquire_lease(r, cache_key)
+            if token is not None:
+                return None, token
+        except (redis.exceptions.TimeoutError, redis.exceptions.ConnectionError) as e:
+            self.record_redis_error(e)
+            logging.error("acquire cache lease call timed out: %s (trace id: %s)", str(e),str(trace_id))
+            return None, None
+        except Exception as e:
+            logging.error("Failed to acquire cache lease: %s, trace id is: %s", str(e), str(trace_id))
+            return None, None
+        # the lease is read along with the entry: once its holder released it without writing the entry (another
+        # replica's admission policy did not admit the key, or the compute failed) there is nothing left to wait for
+        deadline = time.monotonic() + self.cache_options.lease_wait
+        while time.monotonic() < deadline:
+            time.sleep(self.cache_options.lease_poll_interval)
+            (value, lease), get_latency = self.get_data_from_cache_batch(r, [cache_key, cache_key + LEASE_KEY_SUFFIX], trace_id)
+            if value:
+                self.set_data_in_local_cache(cache_key, value)
+                return value, None
+            if lease is None:
+                break
+        return None, None
+
+    def compute_once(self, aml_request, cache_key, compute, trace_id):
+        # compute() returns (api_response, tgt_dict) and is expected to write the entry to the cache.
+        # Only one compute per cache key runs in this process, and with Cache_Stampede_Lease only one across
+        # replicas; everyone else gets the entry it produced. Returns (api_response, tgt_dict) where tgt_dict is
+        # None when the response was built from another request's result.
+        computed = []
+        def lead():
+            redis_connect = self.redis_connect
+            value, token = self.wait_for_lease_holder(redis_connect, cache_key, trace_id)
+            if value is not None:
+                return value
+            try:
+                api_response, tgt_dict = compute()
+                computed.append((api_response, tgt_dict))
+                return self.value_codec.encode(tgt_dict)
+            finally:
+                if token is not None:
+                    self.release_lease(redis_connect, cache_key, token, trace_id)
+        value = self.single_flight.do(cache_key, lead)
+        if computed:
+            return computed[0]
+        api_response = self.build_cached_response(aml_request.src_text, value)
+        if api_response is None:
+            return compute()
+        return api_response, None
+
+    def record_redis_error(self, e, languages=None):
+        # An exhausted connection pool means every connection is busy, not that Redis is unhealthy; counting it
+        # as a circuit breaker failure would turn the cache off exactly at peak load.
+        if is_pool_exhausted(e):
+            if self.metrics is not None:
+                self.metrics.record_pool_exhausted(languages)
+            return
+        # ShardedRedis has already recorded the failure on the breaker of the node that failed; counting it here
+        # too would let one bad node open the breaker of every healthy shard
+        if not self.is_sharded():
+            self.circuit_breaker.record_failure()
+        if self.metrics is not None:
+            self.metrics.record_timeout(languages)
 
-    def try_get_entry_from_cache(self, aml_request, redis_connect,trace_id,cache_flag):
+    def record_call_error(self, e, languages, action, trace_id):
+        if isinstance(e, (redis.exceptions.TimeoutError, redis.exceptions.ConnectionError)):
+            self.record_redis_error(e, languages)
+            logging.error("%s call timed out: %s (trace id: %s)", action, str(e), str(trace_id))
+        else:
+            if self.metrics is not None:
+                self.metrics.record_error(languages)
+            logging.error("Failed to %s: %s, trace id is: %s", action, str(e), str(trace_id))
+
+    def get_languages(self, aml_request):
+        return (aml_request.src_lang.value, aml_request.tgt_lang.value)
+
+    def record_lookup(self, languages, hit, tier, value):
+        if self.metrics is not None:
+            self.metrics.record_get(languages, hit, tier, len(value) if hit else None)
+
+    def record_set(self, languages, latency, value):
+        if self.metrics is not None:
+            self.metrics.record_set(languages, latency, len(value))
+
+    def queue_write(self, cache_key, value, expiration_time, languages):
+        if not self.write_behind.put(cache_key, value, expiration_time) and self.metrics is not None:
+            self.metrics.record_dropped_write(languages)
+
+    def finish_lookup(self, aml_request, languages, cached_response, cache_tier, tgt_dicts=False, profile=None):
+        # The part of a lookup that does not touch Redis: turns a hit into the response document (or, with
+        # tgt_dicts, the decoded tgt dict) and records the lookup. Returns None for a miss or an unreadable value.
+        result = None
+        if cached_response:
+            result = self.value_codec.decode_tgt_dict(cached_response) if tgt_dicts else self.build_cached_response(aml_request.src_text, cached_response)
+            if profile is not None and result is not None:
+                profile.mark("response_json")
+        self.record_lookup(languages, result is not None, cache_tier, cached_response)
+        return result
+
+    def prepare_write(self, cache_key, tgt_dict):
+        # encodes a computed entry and stores it in L1; returns (value, admit, expiration time) for the Redis write
+        value = self.value_codec.encode(tgt_dict)
+        self.set_data_in_local_cache(cache_key, value)
+        admit, expiration_time = self.get_expiration_time(cache_key)
+        return value, admit, expiration_time
+
+    def queue_entry(self, cache_key, value, expiration_time, languages):
+        self.queue_write(cache_key, value, expiration_time, languages)
+        self.record_set(languages, None, value)
+
+    def get_expiration_extensions(self, cache_keys):
+        items = []
+        for cache_key in cache_keys:
+            expiration_time = self.get_extended_expiration_time(cache_key)
+            if expiration_time is not None:
+                items.append((cache_key, None, expiration_time))
+        return items
+
+    def extend_expirations(self, redis_connect, cache_keys, trace_id):
+        # keys whose hits just made them hot keep their entry for the longer TTL
+        if self.admission_policy is None:
+            return
+        items = self.get_expiration_extensions(cache_keys)
+        if not items:
+            return
+        if self.write_behind is not None:
+            for cache_key, value, expiration_time in items:
+                self.write_behind.put(cache_key, value, expiration_time)
+        elif redis_connect:
+            self.set_data_in_cache_batch(redis_connect, items, trace_id)
+
+    def try_get_entry_from_cache(self, aml_request, redis_connect,trace_id,cache_flag, profile=None):
         source_fast_words, orig_tgt_fast_words, space_norm_source, space_norm_orig_tgt = self.normalized_sentence(aml_request.src_text, aml_request.tgt_text)
         if cache_flag == "true":
             src_lang_str = str(aml_request.src_lang)
             tgt_lang_str = str(aml_request.tgt_lang)
-            if redis_connect:
+            if redis_connect or self.local_cache is not None:
+                languages = self.get_languages(aml_request)
                 cache_key = self.GenerateCacheKey(src_lang_str, tgt_lang_str, source_fast_words, orig_tgt_fast_words)
-                print('cache_key:',cache_key)
-                cached_response, get_latency = self.get_data_from_cache(redis_connect, cache_key,trace_id)
-                if cached_response:
-                    cached_response_valid_json = cached_response.replace("'", "\"")
-                    cached_response_obj = json.loads(cached_response_valid_json)
-                    updated_cached_response = {"src_sentence": aml_request.src_text, "tgt": cached_response_obj}
-                    updated_cached_response_str = json.dumps(updated_cached_response)
+                if profile is not None:
+                    profile.mark("cache_key")
+                cached_response, get_latency = self.get_data_from_local_cache(cache_key)
+                cache_tier = "l1"
+                if cached_response is None and redis_connect:
+                    cache_tier = "redis"
+                    cached_response, get_latency = self.get_data_from_cache(redis_connect, cache_key,trace_id, languages)
+                    if cached_response:
+                        self.set_data_in_local_cache(cache_key, cached_response)
+                if profile is not None:
+                    profile.mark("cache_get")
+                updated_cached_response_str = self.finish_lookup(aml_request, languages, cached_response, cache_tier, profile=profile)
+                if updated_cached_response_str is not None:
+                    self.extend_expirations(redis_connect, [cache_key], trace_id)
                     return updated_cached_response_str, get_latency, cache_key,source_fast_words, orig_tgt_fast_words, space_norm_source, space_norm_orig_tgt
                 return None, None, cache_key,source_fast_words, orig_tgt_fast_words, space_norm_source, space_norm_orig_tgt
             logging.error("Cache Get: No Cache Redis Connection was established.")
         return None, None, None, source_fast_words, orig_tgt_fast_words, space_norm_source, space_norm_orig_tgt
 
     def try_set_entry_from_cache(self,updated_cached_response_str, redis_connect, cache_key, tgt_dict, trace_id,
-                                 cache_flag):
+                                 cache_flag, aml_request=None):
         if cache_flag == "true":
+            if updated_cached_response_str is None and cache_key is not None:
+                languages = self.get_languages(aml_request) if aml_request is not None else None
+                tgt_part_str, admit, expiration_time = self.prepare_write(cache_key, tgt_dict)
+                if not admit:
+                    return None
+                if self.write_behind is not None:
+                    self.queue_entry(cache_key, tgt_part_str, expiration_time, languages)
+                    return None
+                if redis_connect:
+                    set_latency = self.set_data_in_cache(redis_connect, cache_key, tgt_part_str, trace_id, expiration_time, languages)
+                    self.record_set(languages, set_latency, tgt_part_str)
+                    return set_latency
+            if not redis_connect:
+                logging.error("Cache Set: No Cache Redis Connection was established.")
+        else:
+            logging.error("Cache not enabled or not an online deployment.")
+        return None
+
+    def try_get_entries_from_cache(self, aml_requests, redis_connect, trace_id, cache_flag, tgt_dicts=False):
+        # One MGET round trip for the L1 misses of the whole batch; entries keep the shape of try_get_entry_from_cache.
+        normalized = [self.normalized_sentence(aml_request.src_text, aml_request.tgt_text) for aml_request in aml_requests]
+        if cache_flag != "true" or not aml_requests:
+            return [(None, None, None) + norm for norm in normalized]
+        if not redis_connect and self.local_cache is None:
+            logging.error("Cache Batch Get: No Cache Redis Connection was established.")
+            return [(None, None, None) + norm for norm in normalized]
+        cache_keys = [self.GenerateCacheKey(str(aml_request.src_lang), str(aml_request.tgt_lang), norm[0], norm[1])
+                      for aml_request, norm in zip(aml_requests, normalized)]
+        cached_responses = []
+        latencies = []
+        tiers = []
+        for cache_key in cache_keys:
+            cached_response, get_latency = self.get_data_from_local_cache(cache_key)
+            cached_responses.append(cached_response)
+            latencies.append(get_latency)
+            tiers.append("l1")
+        missing = [index for index, cached_response in enumerate(cached_responses) if cached_response is None]
+        if missing and redis_connect:
+            values, get_latency = self.get_data_from_cache_batch(redis_connect, [cache_keys[index] for index in missing], trace_id,
+                                                                 self.get_languages(aml_requests[missing[0]]))
+            for index, value in zip(missing, values):
+                tiers[index] = "redis"
+                if value:
+                    cached_responses[index] = value
+                    latencies[index] = get_latency
+                    self.set_data_in_local_cache(cache_keys[index], value)
+        entries = []
+        hit_keys = []
+        for aml_request, norm, cache_key, cached_response, get_latency, cache_tier in zip(aml_requests, normalized, cache_keys, cached_responses, latencies, tiers):
+            updated_cached_response_str = self.finish_lookup(aml_request, self.get_languages(aml_request), cached_response, cache_tier, tgt_dicts)
+            if updated_cached_response_str is not None:
+                hit_keys.append(cache_key)
+                entries.append((updated_cached_response_str, get_latency, cache_key) + norm)
+            else:
+                entries.append((None, None, cache_key) + norm)
+        self.extend_expirations(redis_connect, hit_keys, trace_id)
+        return entries
+
+    def try_set_entries_from_cache(self, entries, redis_connect, trace_id, cache_flag):
+        # entries is a list of (cache_key, tgt_dict, aml_request) for the misses of a batch, written in one pipeline.
+        if cache_flag == "true":
+            items = []
+            item_languages = []
+            for cache_key, tgt_dict, aml_request in entries:
+                if cache_key is not None:
+                    value, admit, expiration_time = self.prepare_write(cache_key, tgt_dict)
+                    if admit:
+                        items.append((cache_key, value, expiration_time))
+                        item_languages.append(self.get_languages(aml_request))
+            if self.write_behind is not None:
+                for (cache_key, value, expiration_time), languages in zip(items, item_languages):
+                    self.queue_entry(cache_key, value, expiration_time, languages)
+                return None
             if redis_connect:
-                if updated_cached_response_str is None:
-                    tgt_part_str = str(tgt_dict)
-                    set_latency = self.set_data_in_cache(redis_connect, cache_key, tgt_part_str, trace_id, os.getenv("Cache_expiration_time"))
+                if items:
+                    set_latency = self.set_data_in_cache_batch(redis_connect, items, trace_id, None, item_languages[0])
+                    # the pipeline latency is recorded once, the value sizes per entry
+                    for index, ((cache_key, value, expiration_time), languages) in enumerate(zip(items, item_languages)):
+                        self.record_set(languages, set_latency if index == 0 else None, value)
                     return set_latency
             else:
-                logging.error("Cache Set: No Cache Redis Connection was established.")
+                logging.error("Cache Batch Set: No Cache Redis Connection was established.")
         else:
             logging.error("Cache not enabled or not an online deployment.")
         return None
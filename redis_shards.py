@@ -0,0 +1,238 @@
+import bisect
+import hashlib
+import logging
+import random
+import redis
+from redis.cluster import RedisCluster
+DEFAULT_REDIS_PORT = 6380
+RING_POINTS_PER_SHARD = 160
+REDIS_ERRORS = (redis.exceptions.TimeoutError, redis.exceptions.ConnectionError)
+
+
+def parse_endpoints(value, default_port=DEFAULT_REDIS_PORT):
+    # "host1:6380,host2" -> [("host1", 6380), ("host2", default_port)]
+    endpoints = []
+    for endpoint in (value or "").split(","):
+        endpoint = endpoint.strip()
+        if not endpoint:
+            continue
+        host, _, port = endpoint.partition(":")
+        endpoints.append((host, int(port) if port else default_port))
+    return endpoints
+
+
+def parse_replica_groups(value, default_port=DEFAULT_REDIS_PORT):
+    # "r1a,r1b;r2a" -> the replica endpoints of every shard, in the order of the shards in Redis_Cache
+    if not value:
+        return []
+    return [parse_endpoints(group, default_port) for group in value.split(";")]
+
+
+def ring_hash(key):
+    if isinstance(key, str):
+        key = key.encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "big")
+
+
+def is_pool_exhausted(e):
+    # BlockingConnectionPool raises a plain ConnectionError when no connection frees up within its timeout
+    return isinstance(e, redis.exceptions.ConnectionError) and str(e) == "No connection available."
+
+
+def disconnect_client(redis_connect):
+    if isinstance(redis_connect, ShardedRedis):
+        redis_connect.disconnect()
+    elif isinstance(redis_connect, RedisCluster):
+        redis_connect.disconnect_connection_pools()
+    else:
+        redis_connect.connection_pool.disconnect(inuse_connections=False)
+
+
+class CacheRedisCluster(RedisCluster):
+    # cache keys of one MGET live in different hash slots, so reads are split per node instead of failing with CROSSSLOT
+    def mget(self, keys, *args):
+        return self.mget_nonatomic(keys, *args)
+
+
+class RedisShard:
+    # One primary and its read replicas, each with its own circuit breaker so a failing node is routed around.
+    # The breakers come from get_circuit_breaker(name) so that they outlive the clients, which are replaced on
+    # every token refresh.
+    def __init__(self, name, primary, replicas, get_circuit_breaker):
+        self.name = name
+        self.primary = primary
+        self.circuit_breaker = get_circuit_breaker(name)
+        self.replicas = [(replica, get_circuit_breaker(f"{name} replica {index}"))
+                         for index, replica in enumerate(replicas)]
+
+    def get_replica(self):
+        # a random replica whose circuit is closed, or None
+        if not self.replicas:
+            return None
+        start = random.randrange(len(self.replicas))
+        for offset in range(len(self.replicas)):
+            replica, circuit_breaker = self.replicas[(start + offset) % len(self.replicas)]
+            if circuit_breaker.allow_request():
+                return replica, circuit_breaker
+        return None
+
+    def get_clients(self):
+        return [self.primary] + [replica for replica, _ in self.replicas]
+
+
+class ShardedRedis:
+    # Client-side sharding over several Redis primaries. Keys are placed on a consistent hash ring, so adding a
+    # shard only moves about 1/n of the keys. A shard whose circuit is open is skipped and its keys go to the next
+    # shard on the ring until it recovers; for a cache that is a few extra misses instead of a timeout per request.
+    # With every circuit open calls fail right away, since RedisCache leaves failure accounting to these breakers.
+    # Keys under pinned_prefix (the generation counters) are never rerouted: reading a counter from the wrong shard
+    # would bring back an invalidated key space. Only the part of the redis.Redis interface that RedisCache and
+    # CacheKeyBuilder use is provided.
+    def __init__(self, shards, read_from_replicas, pinned_prefix=None):
+        self.shards = shards
+        self.read_from_replicas = read_from_replicas
+        self.pinned_prefix = pinned_prefix
+        points = sorted((ring_hash(f"{shard.name}#{point}"), index)
+                        for index, shard in enumerate(shards) for point in range(RING_POINTS_PER_SHARD))
+        self.ring_hashes = [point_hash for point_hash, _ in points]
+        self.ring_shards = [index for _, index in points]
+
+    def get_shard(self, key):
+        # the owner of the key, or the next shard clockwise whose circuit is closed
+        if isinstance(key, str):
+            key = key.encode("utf-8")
+        position = bisect.bisect(self.ring_hashes, ring_hash(key))
+        owner = self.shards[self.ring_shards[position % len(self.ring_shards)]]
+        if self.pinned_prefix and key.startswith(self.pinned_prefix):
+            return owner
+        if owner.circuit_breaker.allow_request():
+            return owner
+        checked = {id(owner)}
+        for offset in range(1, len(self.ring_shards)):
+            shard = self.shards[self.ring_shards[(position + offset) % len(self.ring_shards)]]
+            if id(shard) in checked:
+                continue
+            if shard.circuit_breaker.allow_request():
+                return shard
+            checked.add(id(shard))
+            if len(checked) == len(self.shards):
+                break
+        raise redis.exceptions.ConnectionError("No cache shard available.")
+
+    def group_by_shard(self, keys):
+        groups = {}
+        for index, key in enumerate(keys):
+            shard = self.get_shard(key)
+            groups.setdefault(id(shard), (shard, []))[1].append(index)
+        return groups.values()
+
+    def call(self, circuit_breaker, fn, *args, **kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except REDIS_ERRORS as e:
+            if not is_pool_exhausted(e):
+                circuit_breaker.record_failure()
+            raise
+        circuit_breaker.record_success()
+        return result
+
+    def read(self, shard, method, *args):
+        # reads go to a replica when enabled and fall back to the primary when the replica fails
+        if self.read_from_replicas:
+            replica = shard.get_replica()
+            if replica is not None:
+                client, circuit_breaker = replica
+                try:
+                    return self.call(circuit_breaker, getattr(client, method), *args)
+                except REDIS_ERRORS as e:
+                    logging.error("Replica read on shard %s failed, falling back to the primary: %s", shard.name, str(e))
+        return self.call(shard.circuit_breaker, getattr(shard.primary, method), *args)
+
+    def write(self, key, method, *args, **kwargs):
+        shard = self.get_shard(key)
+        return self.call(shard.circuit_breaker, getattr(shard.primary, method), *args, **kwargs)
+
+    def get(self, key):
+        return self.read(self.get_shard(key), "get", key)
+
+    def mget(self, keys):
+        # one MGET per shard; keys of a shard that fails read as misses unless every shard failed
+        values = [None] * len(keys)
+        groups = self.group_by_shard(keys)
+        failures = 0
+        for shard, indexes in groups:
+            try:
+                shard_values = self.read(shard, "mget", [keys[index] for index in indexes])
+            except REDIS_ERRORS as e:
+                logging.error("MGET on shard %s failed: %s", shard.name, str(e))
+                failures += 1
+                if failures == len(groups):
+                    raise
+                continue
+            for index, value in zip(indexes, shard_values):
+                values[index] = value
+        return values
+
+    def set(self, key, value, **kwargs):
+        return self.write(key, "set", key, value, **kwargs)
+
+    def setex(self, key, time, value):
+        return self.write(key, "setex", key, time, value)
+
+    def expire(self, key, time):
+        return self.write(key, "expire", key, time)
+
+    def incr(self, key):
+        return self.write(key, "incr", key)
+
+    def eval(self, script, numkeys, *keys_and_args):
+        # scripts are routed by their first key
+        return self.write(keys_and_args[0], "eval", script, numkeys, *keys_and_args)
+
+    def pipeline(self, transaction=False):
+        return ShardedPipeline(self)
+
+    def disconnect(self):
+        for shard in self.shards:
+            for client in shard.get_clients():
+                disconnect_client(client)
+
+
+class ShardedPipeline:
+    # Buffers commands and runs one non-transactional pipeline per shard on execute().
+    def __init__(self, sharded_redis):
+        self.sharded_redis = sharded_redis
+        self.commands = []
+
+    def set(self, key, value, **kwargs):
+        self.commands.append(("set", (key, value), kwargs))
+        return self
+
+    def setex(self, key, time, value):
+        self.commands.append(("setex", (key, time, value), {}))
+        return self
+
+    def expire(self, key, time):
+        self.commands.append(("expire", (key, time), {}))
+        return self
+
+    def execute(self):
+        commands, self.commands = self.commands, []
+        results = [None] * len(commands)
+        error = None
+        for shard, indexes in self.sharded_redis.group_by_shard([args[0] for _, args, _ in commands]):
+            pipe = shard.primary.pipeline(transaction=False)
+            for index in indexes:
+                method, args, kwargs = commands[index]
+                getattr(pipe, method)(*args, **kwargs)
+            try:
+                shard_results = self.sharded_redis.call(shard.circuit_breaker, pipe.execute)
+            except REDIS_ERRORS as e:
+                logging.error("Pipeline on shard %s failed: %s", shard.name, str(e))
+                error = e
+                continue
+            for index, result in zip(indexes, shard_results):
+                results[index] = result
+        if error is not None:
+            raise error
+        return results
@@ -0,0 +1,69 @@
+import copy
+import nltk
+from api_interfaces import ApiGender
+
+# punkt models shipped with the nltk data loaded in init()
+PUNKT_LANGUAGES = {
+    "cs": "czech", "da": "danish", "de": "german", "el": "greek", "en": "english", "es": "spanish",
+    "et": "estonian", "fi": "finnish", "fr": "french", "it": "italian", "nl": "dutch", "no": "norwegian",
+    "pl": "polish", "pt": "portuguese", "ru": "russian", "sl": "slovene", "sv": "swedish", "tr": "turkish",
+}
+
+
+def split_sentences(text, lang_code):
+    # returns [(start, end)] spans of the sentences in text, or None when the language has no punkt model
+    # or the tokenizer output cannot be located in the original text
+    punkt_language = PUNKT_LANGUAGES.get(lang_code)
+    if punkt_language is None:
+        return None
+    try:
+        sentences = nltk.sent_tokenize(text, language=punkt_language)
+    except LookupError:
+        # the nltk data shipped with the model has no punkt model for the language
+        return None
+    spans = []
+    pos = 0
+    for sentence in sentences:
+        start = text.find(sentence, pos)
+        if start < 0:
+            return None
+        pos = start + len(sentence)
+        spans.append((start, pos))
+    return spans
+
+
+def split_into_segments(aml_request):
+    # Splits a multi-sentence request into one request per aligned sentence pair. Returns (segment requests,
+    # target separators) where separators[i] is the target text between segment i and i + 1, or (None, None)
+    # when the request is a single sentence or source and target do not split into the same number of sentences.
+    src_spans = split_sentences(aml_request.src_text, aml_request.src_lang.value)
+    tgt_spans = split_sentences(aml_request.tgt_text, aml_request.tgt_lang.value)
+    if not src_spans or not tgt_spans or len(src_spans) < 2 or len(src_spans) != len(tgt_spans):
+        return None, None
+    segment_requests = []
+    for (src_start, src_end), (tgt_start, tgt_end) in zip(src_spans, tgt_spans):
+        segment_request = copy.copy(aml_request)
+        segment_request.src_text = aml_request.src_text[src_start:src_end]
+        segment_request.tgt_text = aml_request.tgt_text[tgt_start:tgt_end]
+        segment_requests.append(segment_request)
+    separators = [aml_request.tgt_text[tgt_spans[index][1]:tgt_spans[index + 1][0]] for index in range(len(tgt_spans) - 1)]
+    return segment_requests, separators
+
+
+def join_segments(texts, separators):
+    parts = [texts[0]]
+    for separator, text in zip(separators, texts[1:]):
+        parts.append(separator)
+        parts.append(text)
+    return "".join(parts)
+
+
+def merge_segment_tgt_dicts(tgt_dicts, separators):
+    # Segments without a reinflection only carry a Neutral entry; they contribute the same text to both genders.
+    neutral = str(ApiGender.Neutral)
+    if all(list(tgt_dict.keys()) == [neutral] for tgt_dict in tgt_dicts):
+        return {neutral: join_segments([tgt_dict[neutral] for tgt_dict in tgt_dicts], separators)}
+    merged = {}
+    for gender in (str(ApiGender.Feminine), str(ApiGender.Masculine)):
+        merged[gender] = join_segments([tgt_dict.get(gender, tgt_dict.get(neutral)) for tgt_dict in tgt_dicts], separators)
+    return merged
@@ -0,0 +1,143 @@
+import bisect
+import random
+import threading
+import time
+from opencensus.stats import aggregation as aggregation_module
+from opencensus.stats import measure as measure_module
+from opencensus.stats import view as view_module
+from opencensus.tags import tag_map as tag_map_module
+from cache_metrics import latency_buckets_ms
+
+##https://opencensus.io/stats/measure/
+stage_latency_measure = measure_module.MeasureFloat("stage_latency",
+                                           "latency of a stage of a sampled scoring request",
+                                           "ms")
+
+stage_latency_view = view_module.View("stage latency view",
+                               "distribution of scoring stage latency",
+                               ["stage"],
+                               stage_latency_measure,
+                               aggregation_module.DistributionAggregation(latency_buckets_ms))
+
+# in-memory histogram bucket bounds, 10 microseconds to about 100 seconds with 12% wide buckets
+HISTOGRAM_BOUNDS_NS = [int(10000 * 1.12 ** index) for index in range(143)]
+
+
+class StageHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(HISTOGRAM_BOUNDS_NS) + 1)
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, duration_ns):
+        self.counts[bisect.bisect_left(HISTOGRAM_BOUNDS_NS, duration_ns)] += 1
+        self.count += 1
+        self.total_ns += duration_ns
+        self.max_ns = max(self.max_ns, duration_ns)
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.count += other.count
+        self.total_ns += other.total_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+
+    def percentile(self, fraction):
+        # upper bound of the bucket holding the percentile, capped at the largest value seen
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return min(HISTOGRAM_BOUNDS_NS[index], self.max_ns) if index < len(HISTOGRAM_BOUNDS_NS) else self.max_ns
+        return self.max_ns
+
+    def get_stats(self):
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ns / self.count / 1e6, 3) if self.count else 0,
+            "p50_ms": round(self.percentile(0.5) / 1e6, 3),
+            "p90_ms": round(self.percentile(0.9) / 1e6, 3),
+            "p99_ms": round(self.percentile(0.99) / 1e6, 3),
+            "max_ms": round(self.max_ns / 1e6, 3),
+        }
+
+
+class RequestProfile:
+    # Stage timings of one sampled request; mark(stage) closes the stage that started at the previous mark.
+    def __init__(self, profiler):
+        self.profiler = profiler
+        self.stages = []
+        self.start = self.last = time.perf_counter_ns()
+
+    def mark(self, stage):
+        now = time.perf_counter_ns()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+
+    def finish(self):
+        # measured to now, so the total includes whatever ran after the last mark (building the response, errors)
+        self.stages.append(("total", time.perf_counter_ns() - self.start))
+        self.profiler.record(self.stages)
+
+
+class StageProfiler:
+    # Times the stages of a sample_rate fraction of requests. Histograms are kept for the current and the previous
+    # window of window seconds, so get_snapshot() covers the last one to two windows; with a stats recorder every
+    # stage is also recorded to stage_latency_view for the metrics exporter. Requests that are not sampled get None
+    # from start() and skip all timing.
+    def __init__(self, sample_rate, window, stats_recorder=None):
+        self.sample_rate = sample_rate
+        self.window = window
+        self.stats_recorder = stats_recorder
+        self.current = {}
+        self.previous = {}
+        self.window_start = time.monotonic()
+        self.tag_maps = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return None
+        return RequestProfile(self)
+
+    def rotate(self, now):
+        self.previous = self.current if now - self.window_start < 2 * self.window else {}
+        self.current = {}
+        self.window_start = now
+
+    def get_tag_map(self, stage):
+        tag_map = self.tag_maps.get(stage)
+        if tag_map is None:
+            tag_map = tag_map_module.TagMap()
+            tag_map.insert("stage", stage)
+            self.tag_maps[stage] = tag_map
+        return tag_map
+
+    def record(self, stages):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.window:
+                self.rotate(now)
+            for stage, duration_ns in stages:
+                histogram = self.current.get(stage)
+                if histogram is None:
+                    histogram = self.current[stage] = StageHistogram()
+                histogram.record(duration_ns)
+        if self.stats_recorder is not None:
+            for stage, duration_ns in stages:
+                measurement_map = self.stats_recorder.new_measurement_map()
+                measurement_map.measure_float_put(stage_latency_measure, duration_ns / 1e6)
+                measurement_map.record(self.get_tag_map(stage))
+
+    def get_snapshot(self):
+        with self.lock:
+            now = time.monotonic()
+            if now - self.window_start >= self.window:
+                self.rotate(now)
+            merged = {}
+            for histograms in (self.previous, self.current):
+                for stage, histogram in histograms.items():
+                    merged.setdefault(stage, StageHistogram()).merge(histogram)
+        return {stage: histogram.get_stats() for stage, histogram in merged.items()}
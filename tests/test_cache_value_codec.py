@@ -0,0 +1,86 @@
+import json
+import zlib
+import pytest
+
+pytest.importorskip("api_interfaces")
+from api_interfaces import ApiGender
+from cache_value_codec import (CacheValueCodec, COMPRESSION_NONE, COMPRESSION_ZLIB, COMPRESSION_ZSTD,
+                               VALUE_FORMAT_V1, zstandard)
+
+NEUTRAL = str(ApiGender.Neutral)
+FEMININE = str(ApiGender.Feminine)
+MASCULINE = str(ApiGender.Masculine)
+
+
+@pytest.mark.parametrize("tgt_dict", [
+    {NEUTRAL: "La casa es grande."},
+    {FEMININE: "La doctora está cansada.", MASCULINE: "El doctor está cansado."},
+    {FEMININE: "", MASCULINE: "ünïcödé ✓ 日本語"},
+    {"customGender": "explicit key", NEUTRAL: "x" * 300},
+])
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+def test_round_trip(tgt_dict, compression):
+    codec = CacheValueCodec(compression, 16)
+    value = codec.encode(tgt_dict)
+    assert value[0] == VALUE_FORMAT_V1
+    assert codec.decode_tgt_dict(value) == tgt_dict
+
+
+def test_compression_threshold():
+    codec = CacheValueCodec("zlib", 64)
+    assert codec.encode({NEUTRAL: "short"})[1] == COMPRESSION_NONE
+    long_value = codec.encode({NEUTRAL: "a long sentence " * 20})
+    assert long_value[1] == COMPRESSION_ZLIB
+    assert codec.decode_tgt_dict(long_value) == {NEUTRAL: "a long sentence " * 20}
+
+
+@pytest.mark.skipif(zstandard is None, reason="zstandard is not installed")
+def test_zstd_round_trip_and_cross_decode():
+    tgt_dict = {FEMININE: "una frase larga " * 20, MASCULINE: "un texto largo " * 20}
+    value = CacheValueCodec("zstd", 16).encode(tgt_dict)
+    assert value[1] == COMPRESSION_ZSTD
+    # a reader configured for zlib or no compression still reads values written with zstd
+    assert CacheValueCodec("zlib", 16).decode_tgt_dict(value) == tgt_dict
+    assert CacheValueCodec("none", 16).decode_tgt_dict(value) == tgt_dict
+
+
+def test_build_response_matches_json_dumps():
+    codec = CacheValueCodec("zlib", 512)
+    tgt_dict = {FEMININE: 'Ella dijo "hola"\n', MASCULINE: "Él dijo \\hola/"}
+    response = codec.build_response("She said \"hi\"", codec.encode(tgt_dict))
+    assert response == json.dumps({"src_sentence": "She said \"hi\"", "tgt": tgt_dict})
+
+
+@pytest.mark.parametrize("value", [
+    b"{'gender': 'text'}",                                   # pre-namespace repr values are not read
+    bytes((99, COMPRESSION_NONE)) + b"\x00\x01a",            # unknown format
+    bytes((VALUE_FORMAT_V1, 7)) + b"\x00\x01a",              # unknown compression
+    bytes((VALUE_FORMAT_V1, COMPRESSION_ZLIB)) + b"not zlib",
+    bytes((VALUE_FORMAT_V1, COMPRESSION_NONE)) + b"\x00\x05ab",    # text shorter than its length
+    bytes((VALUE_FORMAT_V1, COMPRESSION_NONE)) + b"\x00\x80",      # truncated varint
+    bytes((VALUE_FORMAT_V1, COMPRESSION_NONE)) + b"\x00\x02\xff\xfe",  # invalid UTF-8
+    bytes((VALUE_FORMAT_V1, COMPRESSION_NONE)) + b"\x09\x01a",     # unknown gender code
+    b"",
+])
+def test_decode_failures_return_none(value):
+    codec = CacheValueCodec("zlib", 512)
+    assert codec.decode(value) is None
+    assert codec.decode_tgt_dict(value) is None
+    assert codec.build_response("src", value) is None
+
+
+def test_truncated_value_is_rejected():
+    codec = CacheValueCodec("none", 512)
+    value = codec.encode({FEMININE: "la frase", MASCULINE: "el texto"})
+    entries = codec.decode(value)
+    # a cut at an entry boundary reads as fewer entries, never as a shortened text
+    allowed = [None] + [entries[:count] for count in range(len(entries))]
+    for end in range(2, len(value)):
+        assert codec.decode(value[:end]) in allowed
+
+
+def test_corrupted_compressed_value_is_rejected():
+    codec = CacheValueCodec("zlib", 0)
+    value = codec.encode({NEUTRAL: "texto " * 50})
+    assert codec.decode(value[:2] + zlib.compress(b"\x00\x05ab")) is None
+    assert codec.decode(value[:-4]) is None
@@ -0,0 +1,206 @@
+import pytest
+
+redis = pytest.importorskip("redis")
+from circuit_breaker import CircuitBreaker
+from redis_shards import RedisShard, ShardedRedis, ring_hash
+
+GENERATION_PREFIX = b"gen:"
+
+
+class FakeRedis:
+    # a dict backed client that raises error on every command while error is set
+    def __init__(self, name):
+        self.name = name
+        self.data = {}
+        self.error = None
+        self.calls = []
+
+    def run(self, method):
+        self.calls.append(method)
+        if self.error is not None:
+            raise self.error
+
+    def get(self, key):
+        self.run("get")
+        return self.data.get(key)
+
+    def mget(self, keys):
+        self.run("mget")
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, **kwargs):
+        self.run("set")
+        self.data[key] = value
+        return True
+
+    def incr(self, key):
+        self.run("incr")
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def set(self, key, value, **kwargs):
+        self.commands.append((key, value))
+
+    def execute(self):
+        self.client.run("pipeline")
+        for key, value in self.commands:
+            self.client.data[key] = value
+        return [True] * len(self.commands)
+
+
+def make_sharded(names=("shard0", "shard1", "shard2"), replicas=0, read_from_replicas=False):
+    breakers = {}
+
+    def get_circuit_breaker(name):
+        return breakers.setdefault(name, CircuitBreaker(2, 30, name))
+
+    shards = [RedisShard(name, FakeRedis(name), [FakeRedis(f"{name} replica {index}") for index in range(replicas)],
+                         get_circuit_breaker)
+              for name in names]
+    return ShardedRedis(shards, read_from_replicas, GENERATION_PREFIX), breakers
+
+
+def key_on(sharded, shard):
+    return next(key for key in (f"key{index}" for index in range(10000)) if sharded.get_shard(key) is shard)
+
+
+def fail(shard):
+    shard.primary.error = redis.exceptions.ConnectionError("Connection refused")
+
+
+def test_keys_spread_over_all_shards():
+    sharded, _ = make_sharded()
+    counts = {}
+    for index in range(3000):
+        shard = sharded.get_shard(f"key{index}")
+        counts[shard.name] = counts.get(shard.name, 0) + 1
+    assert sorted(counts) == ["shard0", "shard1", "shard2"]
+    assert min(counts.values()) > 600
+
+
+def test_adding_a_shard_moves_few_keys():
+    three, _ = make_sharded()
+    four, _ = make_sharded(("shard0", "shard1", "shard2", "shard3"))
+    keys = [f"key{index}" for index in range(3000)]
+    moved = sum(three.get_shard(key).name != four.get_shard(key).name for key in keys)
+    assert moved < len(keys) * 0.35
+    assert all(four.get_shard(key).name == "shard3"
+               for key in keys if three.get_shard(key).name != four.get_shard(key).name)
+
+
+def test_failing_shard_is_skipped_once_its_circuit_opens():
+    sharded, _ = make_sharded()
+    failing = sharded.shards[0]
+    key = key_on(sharded, failing)
+    fail(failing)
+    for _ in range(2):
+        with pytest.raises(redis.exceptions.ConnectionError):
+            sharded.set(key, b"value")
+    assert failing.circuit_breaker.is_open()
+
+    fallback = sharded.get_shard(key)
+    assert fallback is not failing
+    assert sharded.set(key, b"value")
+    assert sharded.get(key) == b"value"
+    assert fallback.primary.data[key] == b"value"
+    assert failing.primary.calls == ["set", "set"]
+
+
+def test_generation_keys_are_never_rerouted():
+    sharded, _ = make_sharded()
+    key = next(GENERATION_PREFIX + f"{index}".encode() for index in range(10000)
+               if sharded.get_shard(GENERATION_PREFIX + f"{index}".encode()) is sharded.shards[1])
+    fail(sharded.shards[1])
+    for _ in range(3):
+        with pytest.raises(redis.exceptions.ConnectionError):
+            sharded.incr(key)
+    assert sharded.shards[1].circuit_breaker.is_open()
+    assert sharded.get_shard(key) is sharded.shards[1]
+
+
+def test_all_circuits_open_fails_fast():
+    sharded, _ = make_sharded()
+    key = key_on(sharded, sharded.shards[2])
+    for shard in sharded.shards:
+        for _ in range(2):
+            shard.circuit_breaker.record_failure()
+    with pytest.raises(redis.exceptions.ConnectionError):
+        sharded.get(key)
+    with pytest.raises(redis.exceptions.ConnectionError):
+        sharded.mget([key])
+    assert all(shard.primary.calls == [] for shard in sharded.shards)
+    # generation keys still go to their owner
+    assert sharded.get_shard(GENERATION_PREFIX + b"0") in sharded.shards
+
+
+def test_replica_read_falls_back_to_the_primary():
+    sharded, breakers = make_sharded(names=("shard0",), replicas=1, read_from_replicas=True)
+    shard = sharded.shards[0]
+    shard.primary.data["key"] = b"value"
+    replica = shard.replicas[0][0]
+    replica.error = redis.exceptions.TimeoutError("Timeout reading from socket")
+    assert sharded.get("key") == b"value"
+    assert sharded.get("key") == b"value"
+    assert replica.calls == ["get", "get"]
+    assert breakers["shard0 replica 0"].is_open()
+    assert not shard.circuit_breaker.is_open()
+    # with the replica's circuit open, reads go straight to the primary
+    assert sharded.get("key") == b"value"
+    assert replica.calls == ["get", "get"]
+    assert shard.primary.calls == ["get", "get", "get"]
+
+
+def test_mget_reads_a_failed_shard_as_misses():
+    sharded, _ = make_sharded()
+    keys = [key_on(sharded, shard) for shard in sharded.shards]
+    for key in keys:
+        sharded.set(key, key.encode())
+    fail(sharded.shards[1])
+    assert sharded.mget(keys) == [keys[0].encode(), None, keys[2].encode()]
+
+
+def test_mget_raises_when_every_shard_fails():
+    sharded, _ = make_sharded()
+    keys = [key_on(sharded, shard) for shard in sharded.shards]
+    for shard in sharded.shards:
+        fail(shard)
+    with pytest.raises(redis.exceptions.ConnectionError):
+        sharded.mget(keys)
+
+
+def test_pipeline_writes_each_key_to_its_shard():
+    sharded, _ = make_sharded()
+    keys = [key_on(sharded, shard) for shard in sharded.shards]
+    pipe = sharded.pipeline()
+    for key in keys:
+        pipe.set(key, b"value")
+    assert pipe.execute() == [True, True, True]
+    for key, shard in zip(keys, sharded.shards):
+        assert shard.primary.data == {key: b"value"}
+        assert shard.primary.calls == ["pipeline"]
+
+
+def test_pool_exhaustion_does_not_open_the_circuit():
+    sharded, _ = make_sharded()
+    shard = sharded.shards[0]
+    key = key_on(sharded, shard)
+    shard.primary.error = redis.exceptions.ConnectionError("No connection available.")
+    for _ in range(5):
+        with pytest.raises(redis.exceptions.ConnectionError):
+            sharded.get(key)
+    assert not shard.circuit_breaker.is_open()
+    assert sharded.get_shard(key) is shard
+
+
+def test_ring_hash_is_stable():
+    assert ring_hash("key") == ring_hash(b"key")
+    assert ring_hash("key") != ring_hash("key2")
@@ -0,0 +1,79 @@
+import logging
+import queue
+import threading
+import time
+class WriteBehindQueue:
+    # Bounded queue of pending cache writes drained by a daemon thread in pipelined SETEX batches.
+    # put() never blocks the request: when the queue is full the write is dropped and counted.
+    def __init__(self, redis_cache, max_size, batch_size, flush_interval):
+        self.redis_cache = redis_cache
+        self.queue = queue.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.worker = threading.Thread(target=self.drain, name="cache-write-behind", daemon=True)
+        self.worker.start()
+
+    def put(self, key, value, expiration_time):
+        try:
+            self.queue.put_nowait((key, value, expiration_time))
+            return True
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+                dropped = self.dropped
+            if dropped == 1 or dropped % 1000 == 0:
+                logging.error("Cache write-behind queue is full, %d writes dropped so far", dropped)
+            return False
+
+    def drain(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            # the depth left behind after taking a batch: steadily non-zero means Redis writes cannot keep up
+            metrics = self.redis_cache.metrics
+            if metrics is not None:
+                metrics.record_write_behind_depth(self.queue.qsize())
+            try:
+                self.flush(batch)
+            except Exception as e:
+                logging.error("Cache write-behind flush failed: %s", str(e))
+                with self.lock:
+                    self.failed += len(batch)
+
+    def flush(self, batch):
+        redis_connect = self.redis_cache.redis_connect
+        if not redis_connect:
+            with self.lock:
+                self.failed += len(batch)
+            return
+        batches_by_expiration = {}
+        for key, value, expiration_time in batch:
+            batches_by_expiration.setdefault(expiration_time, []).append((key, value))
+        for expiration_time, items in batches_by_expiration.items():
+            latency = self.redis_cache.set_data_in_cache_batch(redis_connect, items, "write-behind", expiration_time)
+            with self.lock:
+                if latency is None:
+                    self.failed += len(items)
+                else:
+                    self.written += len(items)
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "queue_depth": self.queue.qsize(),
+                "dropped": self.dropped,
+                "written": self.written,
+                "failed": self.failed,
+            }